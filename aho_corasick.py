@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""aho_corasick.py: Aho-Corasick automaton for batch multi-pattern search."""
+
+from array import array
+from collections import deque
+
+from packed_seq import reverse_complement
+
+
+class AhoCorasick(object):
+    """ Holds an Aho-Corasick automaton over a batch of patterns.  The trie
+        is completed into a DFA stored in one flat array (state * sigma +
+        code), so scanning a text costs one array lookup per character no
+        matter how many patterns there are.  With with_rc=True the reverse
+        complement of every pattern is added too and its hits are reported
+        on the '-' strand under the same pattern id. """
+
+    def __init__(self, patterns, alphabet='ACGT', with_rc=False):
+        self.patterns = list(patterns)
+        self.alphabet = alphabet
+        self.sigma = sigma = len(alphabet)
+        # Text character -> code; characters outside the alphabet map to
+        # sigma and send the automaton back to the root
+        self.table = bytes(alphabet.index(chr(c)) if chr(c) in alphabet
+                           else sigma for c in range(256))
+        self.goto = array('i', [-1]) * sigma
+        self.depth = array('i', [0])
+        self.terminal = []  # pattern id -> state spelling that pattern
+        self.out = {}  # state -> [(pattern id, strand), ...] ending there
+        for pid, p in enumerate(self.patterns):
+            if not p:
+                raise ValueError('pattern %d is empty' % pid)
+            self.terminal.append(self._insert(p, pid, '+'))
+            if with_rc:
+                rc = reverse_complement(p)
+                if rc != p:  # palindromes would report every hit twice
+                    self._insert(rc, pid, '-')
+        self.fail = array('i', [0]) * len(self.depth)
+        # Nearest proper suffix state (via fail links) that has outputs
+        self.out_link = array('i', [-1]) * len(self.depth)
+        self._build_links()
+
+    def _new_state(self, depth):
+        self.goto.extend([-1] * self.sigma)
+        self.depth.append(depth)
+        return len(self.depth) - 1
+
+    def _insert(self, p, pid, strand):
+        state = 0
+        for ch in p:
+            c = self.table[ord(ch)] if ord(ch) < 256 else self.sigma
+            if c == self.sigma:
+                raise ValueError('pattern %d has character %r outside the '
+                                 'alphabet' % (pid, ch))
+            nxt = self.goto[state * self.sigma + c]
+            if nxt == -1:
+                nxt = self._new_state(self.depth[state] + 1)
+                self.goto[state * self.sigma + c] = nxt
+            state = nxt
+        self.out.setdefault(state, []).append((pid, strand))
+        return state
+
+    def _build_links(self):
+        """ Breadth-first pass setting fail links and filling in the
+            missing goto transitions so the automaton becomes a DFA """
+        sigma, goto, fail = self.sigma, self.goto, self.fail
+        queue = deque()
+        for c in range(sigma):
+            nxt = goto[c]
+            if nxt == -1:
+                goto[c] = 0
+            else:
+                fail[nxt] = 0
+                queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            f = fail[state]
+            self.out_link[state] = f if f in self.out else self.out_link[f]
+            for c in range(sigma):
+                nxt = goto[state * sigma + c]
+                if nxt == -1:
+                    goto[state * sigma + c] = goto[f * sigma + c]
+                else:
+                    fail[nxt] = goto[f * sigma + c]
+                    queue.append(nxt)
+
+    def search(self, t):
+        """ Yield (offset, pattern id, strand) for every occurrence of every
+            pattern in t, in order of the occurrence's end position
+        Example:
+        >>> ac = AhoCorasick(["ACG", "CGT", "GG"], with_rc=True)
+        >>> sorted(ac.search("ACGTTCCAGG"))
+        [(0, 0, '+'), (0, 1, '-'), (1, 0, '-'), (1, 1, '+'), (5, 2, '-'), (8, 2, '+')]
+        """
+        if isinstance(t, str):
+            t = t.encode('ascii')
+        codes = bytes(t).translate(self.table)
+        sigma, goto, out, out_link = self.sigma, self.goto, self.out, \
+            self.out_link
+        depth = self.depth
+        state = 0
+        for i, c in enumerate(codes):
+            if c == sigma:
+                state = 0
+                continue
+            state = goto[state * sigma + c]
+            s = state if state in out else out_link[state]
+            while s != -1:
+                start = i - depth[s] + 1
+                for pid, strand in out[s]:
+                    yield start, pid, strand
+                s = out_link[s]
+
+    def find_all(self, t):
+        """ Return a list, indexed by pattern id, of sorted (offset, strand)
+            hits of that pattern in t """
+        hits = [[] for _ in self.patterns]
+        for start, pid, strand in self.search(t):
+            hits[pid].append((start, strand))
+        for h in hits:
+            h.sort()
+        return hits
+
+
+def multi_pattern_search(patterns, t, with_rc=True):
+    """ Find all patterns (and by default their reverse complements) in t
+        with a single pass; returns offsets per pattern id, like calling
+        naive_with_rc once per pattern.
+    Example:
+    >>> multi_pattern_search(["ATGC", "TTT"], "AATGCTACGTTATGC")
+    [[1, 11], []]
+    """
+    ac = AhoCorasick(patterns, with_rc=with_rc)
+    return [sorted(set(off for off, _ in h)) for h in ac.find_all(t)]
+
+
+if __name__ == "__main__":
+    import doctest
+    if doctest.testmod().failed == 0:
+        print("Tests passed.")
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+"""alignment.py: Linear-space global/semi-global alignment with CIGARs."""
+
+from collections import namedtuple
+
+# score: total cost (lower is better); start, end: aligned interval of t;
+# cigar: SAM-style operations for p against t[start:end]
+Alignment = namedtuple('Alignment', ['score', 'start', 'end', 'cigar'])
+
+
+class Scoring(object):
+    """ Alignment costs: substitution cost sub(a, b) and affine gap cost
+        gap_open + gap_extend * length.  The defaults (mismatch 1, gap 0+1)
+        are unit edit-distance costs, so align(p, t).score equals
+        edit_distance(p, t).  matrix, if given, maps (a, b) pairs to their
+        substitution cost; pairs it does not list fall back to 0 for equal
+        characters and mismatch otherwise. """
+
+    def __init__(self, mismatch=1, gap_open=0, gap_extend=1, matrix=None):
+        self.mismatch = mismatch
+        self.gap_open = gap_open
+        self.gap_extend = gap_extend
+        self.matrix = matrix or {}
+
+    def sub(self, a, b):
+        cost = self.matrix.get((a, b))
+        if cost is None:
+            return 0 if a == b else self.mismatch
+        return cost
+
+    def gap(self, length):
+        return self.gap_open + self.gap_extend * length if length else 0
+
+
+def _last_row(a, b, tb, sc, free_start=False):
+    """ Gotoh forward pass keeping one row.  Returns (cc, dd): cc[j] is the
+        best cost of aligning all of a to b[:j], dd[j] the best such cost
+        ending in a gap of a's characters ('I').  tb is the open cost of an
+        'I' gap touching the top boundary.  With free_start, leading
+        characters of b cost nothing (semi-global). """
+    g, h = sc.gap_open, sc.gap_extend
+    n = len(b)
+    cc = [0] * (n + 1)
+    dd = [0] * (n + 1)
+    for j in range(1, n + 1):
+        cc[j] = 0 if free_start else g + h * j
+    for j in range(n + 1):
+        dd[j] = cc[j] + g
+    for i, ac in enumerate(a, 1):
+        s = cc[0]
+        c = cc[0] = tb + h * i
+        dd[0] = c
+        e = c + g
+        for j in range(1, n + 1):
+            e = min(e, c + g) + h  # 'D' gap: b[j-1] against nothing
+            dd[j] = min(dd[j], cc[j] + g) + h  # 'I' gap: a[i-1] alone
+            c = min(dd[j], e, s + sc.sub(ac, b[j - 1]))
+            s = cc[j]
+            cc[j] = c
+    return cc, dd
+
+
+def _diff(a, b, tb, te, sc, ops):
+    """ Append to ops the operations of an optimal global alignment of a
+        and b, found by Myers-Miller divide and conquer on the middle row
+        so that only O(len(b)) cells are live at any time.  tb / te are the
+        open costs of an 'I' gap at the start / end (gap_open, or 0 when it
+        continues a gap already paid for). """
+    m, n = len(a), len(b)
+    g, h = sc.gap_open, sc.gap_extend
+    if n == 0:
+        ops.extend('I' * m)
+        return
+    if m == 0:
+        ops.extend('D' * n)
+        return
+    if m == 1:
+        # Either a[0] is a gap (placed at the cheaper boundary) and b is
+        # all 'D', or a[0] is aligned to some b[j] with 'D' runs around it
+        best = min(tb, te) + h + sc.gap(n)
+        best_j = -1
+        for j in range(n):
+            cost = sc.gap(j) + sc.sub(a[0], b[j]) + sc.gap(n - j - 1)
+            if cost < best:
+                best, best_j = cost, j
+        if best_j == -1:
+            ops.extend('I' + 'D' * n if tb <= te else 'D' * n + 'I')
+        else:
+            ops.extend('D' * best_j + 'M' + 'D' * (n - best_j - 1))
+        return
+    mid = m // 2
+    cc, dd = _last_row(a[:mid], b, tb, sc)
+    rr, ss = _last_row(a[mid:][::-1], b[::-1], te, sc)
+    best, best_j, joined_gap = None, 0, False
+    for j in range(n + 1):
+        cost = cc[j] + rr[n - j]
+        if best is None or cost < best:
+            best, best_j, joined_gap = cost, j, False
+        cost = dd[j] + ss[n - j] - g
+        if cost < best:
+            best, best_j, joined_gap = cost, j, True
+    if not joined_gap:
+        _diff(a[:mid], b[:best_j], tb, g, sc, ops)
+        _diff(a[mid:], b[best_j:], g, te, sc, ops)
+    else:
+        # An 'I' gap crosses the middle row: a[mid-1] and a[mid] lie in it
+        _diff(a[:mid - 1], b[:best_j], tb, 0, sc, ops)
+        ops.extend('II')
+        _diff(a[mid + 1:], b[best_j:], 0, te, sc, ops)
+
+
+def cigar_string(ops):
+    """ Run-length encode a sequence of 'M'/'I'/'D' operations
+    Example:
+    >>> cigar_string("MMMIDDM")
+    '3M1I2D1M'
+    """
+    out = []
+    run, prev = 0, None
+    for op in ops:
+        if op == prev:
+            run += 1
+        else:
+            if prev is not None:
+                out.append('%d%s' % (run, prev))
+            run, prev = 1, op
+    if prev is not None:
+        out.append('%d%s' % (run, prev))
+    return ''.join(out)
+
+
+def alignment_cost(p, t, ops, sc):
+    """ Return the cost of aligning p to t with the given operations """
+    cost = 0
+    i = j = 0
+    prev = None
+    for op in ops:
+        if op == 'M':
+            cost += sc.sub(p[i], t[j])
+            i += 1
+            j += 1
+        else:
+            cost += sc.gap_extend + (sc.gap_open if op != prev else 0)
+            if op == 'I':
+                i += 1
+            else:
+                j += 1
+        prev = op
+    return cost
+
+
+def align(p, t, mode='global', scoring=None):
+    """ Align p to t and return an Alignment (score, start, end, cigar).
+        mode='global' aligns p to all of t; mode='semiglobal' aligns all of
+        p to the best-scoring substring t[start:end], found with a forward
+        pass for end and a reverse pass for start.  The traceback is
+        computed in linear memory (Myers-Miller / Hirschberg with Gotoh
+        affine gaps).
+    Example:
+    >>> align("shake spea", "Shakespear")
+    Alignment(score=3, start=0, end=10, cigar='5M1I4M1D')
+    >>> align("GCGTATGC", "TATTGGCTATACGGTT", mode='semiglobal')
+    Alignment(score=2, start=5, end=12, cigar='2M1I5M')
+    >>> align("GCGTATGC", "TATTGGCTATACGGTT", mode='semiglobal',
+    ...       scoring=Scoring(mismatch=4, gap_open=6, gap_extend=2))
+    Alignment(score=12, start=5, end=12, cigar='2M1I5M')
+    """
+    sc = scoring or Scoring()
+    if mode == 'global':
+        start, end = 0, len(t)
+    elif mode == 'semiglobal':
+        cc, _ = _last_row(p, t, sc.gap_open, sc, free_start=True)
+        end = min(range(len(t) + 1), key=cc.__getitem__)
+        window = t[:end]
+        cc, _ = _last_row(p[::-1], window[::-1], sc.gap_open, sc,
+                          free_start=True)
+        start = end - min(range(end + 1), key=cc.__getitem__)
+    else:
+        raise ValueError('unknown alignment mode %r' % mode)
+    ops = []
+    _diff(p, t[start:end], sc.gap_open, sc.gap_open, sc, ops)
+    return Alignment(alignment_cost(p, t[start:end], ops, sc), start, end,
+                     cigar_string(ops))
+
+
+def banded_align(p, t, diag, k):
+    """ Semi-global unit-cost alignment of all of p to a substring of t
+        where p[i] lies within k of t[diag + i], e.g. a read placed near
+        diag by a seed.  Only the 2k + 1 cells of each row inside that band
+        are filled in, so for short reads the full matrix is kept and
+        traced back directly, which is cheaper than align()'s
+        divide and conquer.  Returns an Alignment like align().  Alignments
+        that leave the band are not considered, so the score can be worse
+        than align()'s on the same t: an alignment of cost at most e that
+        starts within e of diag stays inside a band of k = 2e.
+    Example:
+    >>> banded_align("GCGTATGC", "TATTGGCTATACGGTT", 5, 2)
+    Alignment(score=2, start=5, end=12, cigar='2M1I5M')
+    """
+    m, n = len(p), len(t)
+    width = 2 * k + 1
+    inf = m + n + 1
+    # cell (i, b) is row i of p against column j = diag + i + b - k of t
+    rows = [[inf] * width for _ in range(m + 1)]
+    for b in range(width):
+        if 0 <= diag + b - k <= n:
+            rows[0][b] = 0  # free start
+    for i in range(1, m + 1):
+        prev, row, pc = rows[i - 1], rows[i], p[i - 1]
+        for b in range(width):
+            j = diag + i + b - k
+            if j < 0 or j > n:
+                continue
+            best = prev[b] + (pc != t[j - 1]) if j else inf
+            if b + 1 < width and prev[b + 1] + 1 < best:
+                best = prev[b + 1] + 1  # 'I': p[i-1] against nothing
+            if b and row[b - 1] + 1 < best:
+                best = row[b - 1] + 1  # 'D': t[j-1] against nothing
+            row[b] = best
+    b = min(range(width), key=rows[m].__getitem__)  # free end
+    score, end = rows[m][b], diag + m + b - k
+    if score >= inf:
+        raise ValueError('no alignment of p inside the band')
+    ops = []
+    i = m
+    while i:
+        j = diag + i + b - k
+        c = rows[i][b]
+        if j and c == rows[i - 1][b] + (p[i - 1] != t[j - 1]):
+            ops.append('M')
+            i -= 1
+        elif b + 1 < width and c == rows[i - 1][b + 1] + 1:
+            ops.append('I')
+            i -= 1
+            b += 1
+        else:
+            ops.append('D')
+            b -= 1
+    return Alignment(score, diag + b - k, end, cigar_string(reversed(ops)))
+
+
+if __name__ == "__main__":
+    import doctest
+    if doctest.testmod().failed == 0:
+        print("Tests passed.")
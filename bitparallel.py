@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+"""bitparallel.py: Bit-parallel approximate matching (Shift-And, Myers)."""
+
+
+def pattern_masks(p):
+    """ Return {c: bitmask} with bit j set where p[j] == c
+    Example:
+    >>> sorted(pattern_masks("ACA").items())
+    [('A', 5), ('C', 2)]
+    """
+    masks = {}
+    for j, c in enumerate(p):
+        masks[c] = masks.get(c, 0) | (1 << j)
+    return masks
+
+
+def shift_and_search(p, t, k=0):
+    """ Return end offsets in t of every occurrence of p with at most k
+        mismatches (Hamming distance), Baeza-Yates-Gonnet Shift-And with
+        one state vector per error level.  Python ints serve as bit
+        vectors, so each text character costs O(k * ceil(m / w)) word
+        operations for a pattern of length m.
+    Example:
+    >>> shift_and_search("ATGC", "AATGCTTTATGC")
+    [4, 11]
+    >>> [e - 3 for e in shift_and_search("ATGC", "AATGCTTTATGC", k=3)]
+    [0, 1, 4, 5, 6, 8]
+    """
+    m = len(p)
+    if m == 0:
+        return list(range(len(t) + 1))
+    masks = pattern_masks(p)
+    full = (1 << m) - 1
+    hit = 1 << (m - 1)
+    r = [0] * (k + 1)  # r[d] bit j: p[:j+1] ends here with <= d mismatches
+    ends = []
+    for i, c in enumerate(t):
+        b = masks.get(c, 0)
+        prev = r[0]
+        r[0] = ((prev << 1) | 1) & b
+        for d in range(1, k + 1):
+            cur = r[d]
+            # extend with a match, or spend one more mismatch on this char
+            r[d] = (((cur << 1) | 1) & b) | (((prev << 1) | 1) & full)
+            prev = cur
+        if r[k] & hit:
+            ends.append(i)
+    return ends
+
+
+def myers_search(p, t, k):
+    """ Return (end offset, distance) for every position of t where some
+        substring ending there is within edit distance k of p, using
+        Myers' bit-vector algorithm (vertical deltas of the semi-global DP
+        column packed into two bit vectors).
+    Example:
+    >>> myers_search("GCGTATGC", "TATTGGCTATACGGTT", 2)
+    [(11, 2)]
+    """
+    m = len(p)
+    if m == 0:
+        return [(i, 0) for i in range(-1, len(t))]
+    peq = pattern_masks(p)
+    full = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv = full, 0  # +1 / -1 vertical deltas; column 0 is 0,1,...,m
+    score = m
+    ends = []
+    for i, c in enumerate(t):
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        # Row 0 stays 0 in semi-global matching, so no carry-in bit
+        ph = (ph << 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+        if score <= k:
+            ends.append((i, score))
+    return ends
+
+
+def shift_and_matching(p, t, n=2):
+    """ Return start offsets of p in t with at most n mismatches, the
+        naive_2mm contract on top of shift_and_search
+    Example:
+    >>> shift_and_matching("ATGC", "AATGCTTTATGC", 3)
+    [0, 1, 4, 5, 6, 8]
+    """
+    return [e - len(p) + 1 for e in shift_and_search(p, t, n)]
+
+
+if __name__ == "__main__":
+    import doctest
+    if doctest.testmod().failed == 0:
+        print("Tests passed.")
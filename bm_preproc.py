@@ -5,6 +5,8 @@
 __author__ = "Ben Langmead"
 
 import unittest
+from array import array
+from collections import OrderedDict
 
 
 def z_array(s):
@@ -132,39 +134,118 @@ def dense_bad_char_tab(p, amap):
     return tab
 
 
+def flat_bad_char_tab(p, amap):
+    """ Like dense_bad_char_tab, but flattened into one array: the entry for
+        offset i and character c is at i * len(amap) + amap[c].  Raises
+        ValueError if p has a character outside amap. """
+    sigma = len(amap)
+    tab = array('i')
+    nxt = array('i', [0]) * sigma
+    for i in range(0, len(p)):
+        c = p[i]
+        if c not in amap:
+            raise ValueError('pattern character %r is not in the alphabet'
+                             % c)
+        tab.extend(nxt)
+        nxt[amap[c]] = i+1
+    return tab
+
+
+def good_suffix_shifts(p, big_l, small_l_prime):
+    """ Return array with the (weak) good suffix shift for a mismatch at
+        each offset of p, so that matching needs only one lookup. """
+    length = len(p)
+    shifts = array('i', [0]) * length
+    for i in range(length - 1):
+        if big_l[i+1] > 0:
+            shifts[i] = length - big_l[i+1]
+        else:
+            shifts[i] = length - small_l_prime[i+1]
+    return shifts
+
+
 class BoyerMoore(object):
-    """ Encapsulates pattern and associated Boyer-Moore preprocessing. """
+    """ Encapsulates pattern and associated Boyer-Moore preprocessing.
+        All tables are flat typed arrays: bad_char holds len(p) rows of
+        len(alphabet) entries, good_suffix the shift for a mismatch at each
+        offset. """
 
     def __init__(self, p, alphabet='ACGT'):
+        self.p = p
+        self.alphabet = alphabet
         # Create map from alphabet characters to integers
         self.amap = {alphabet[i]: i for i in range(len(alphabet))}
+        self.sigma = len(alphabet)
         # Make bad character rule table
-        self.bad_char = dense_bad_char_tab(p, self.amap)
+        self.bad_char = flat_bad_char_tab(p, self.amap)
         # Create good suffix rule table
-        _, self.big_l, self.small_l_prime = good_suffix_table(p)
+        _, big_l, small_l_prime = good_suffix_table(p)
+        self.big_l = array('i', big_l)
+        self.small_l_prime = array('i', small_l_prime)
+        self.good_suffix = good_suffix_shifts(p, big_l, small_l_prime)
+        self.match_shift = len(p) - small_l_prime[1]
 
     def bad_character_rule(self, i, c):
         """ Return # skips given by bad character rule at offset i """
         assert c in self.amap
-        assert i < len(self.bad_char)
+        assert i < len(self.p)
         ci = self.amap[c]
-        return i - (self.bad_char[i][ci]-1)
+        return i - (self.bad_char[i*self.sigma + ci]-1)
 
     def good_suffix_rule(self, i):
         """ Given a mismatch at offset i, return amount to shift
             as determined by (weak) good suffix rule. """
-        length = len(self.big_l)
-        assert i < length
-        if i == length - 1:
-            return 0
-        i += 1  # i points to leftmost matching position of P
-        if self.big_l[i] > 0:
-            return length - self.big_l[i]
-        return length - self.small_l_prime[i]
+        assert i < len(self.good_suffix)
+        return self.good_suffix[i]
 
     def match_skip(self):
         """ Return amount to shift in case where P matches T """
-        return len(self.small_l_prime) - self.small_l_prime[1]
+        return self.match_shift
+
+
+class BoyerMooreCache(object):
+    """ Least-recently-used cache of compiled BoyerMoore objects keyed by
+        (pattern, alphabet), holding at most maxsize of them. """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, p, alphabet='ACGT'):
+        """ Return the BoyerMoore object for p, compiling it on a miss """
+        key = (p, alphabet)
+        bm = self._cache.get(key)
+        if bm is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return bm
+        self.misses += 1
+        bm = BoyerMoore(p, alphabet)
+        self._cache[key] = bm
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return bm
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = self.misses = 0
+
+    def info(self):
+        """ Return (hits, misses, maxsize, current size) """
+        return self.hits, self.misses, self.maxsize, len(self._cache)
+
+
+_default_cache = BoyerMooreCache()
+
+
+def compile_pattern(p, alphabet='ACGT'):
+    """ Return a BoyerMoore object for p from the module-wide cache """
+    return _default_cache.get(p, alphabet)
 
 
 class TestBoyerMoorePreproc(unittest.TestCase):
@@ -292,5 +373,37 @@ class TestBoyerMoorePreproc(unittest.TestCase):
         self.assertEqual([0, 0, 0, 0, 0, 0, 0, 4, 4, 4, 8], big_l)
         self.assertEqual([11, 4, 4, 4, 4, 4, 4, 4, 1, 1, 1], small_l_prime)
 
+    def test_flat_bad_char_tab_1(self):
+        amap = {'A': 0, 'C': 1, 'G': 2, 'T': 3}
+        for p in ['GGTAGGT', 'ACGTTACG', 'TTTT']:
+            dense = dense_bad_char_tab(p, amap)
+            flat = flat_bad_char_tab(p, amap)
+            self.assertEqual([x for row in dense for x in row], list(flat))
+
+    def test_boyer_moore_rules_1(self):
+        p = 'GGTAGGT'
+        bm = BoyerMoore(p)
+        big_l_prime, big_l, small_l_prime = good_suffix_table(p)
+        for i in range(len(p)):
+            self.assertEqual(good_suffix_mismatch(i, big_l, small_l_prime),
+                             bm.good_suffix_rule(i))
+        self.assertEqual(good_suffix_match(small_l_prime), bm.match_skip())
+        #  t: GGTAGGC
+        #  p: GGTAGGT
+        self.assertEqual(7, bm.bad_character_rule(6, 'C'))
+        self.assertEqual(3, bm.bad_character_rule(6, 'A'))
+
+    def test_cache_1(self):
+        cache = BoyerMooreCache(maxsize=2)
+        a = cache.get('ACGT')
+        self.assertIs(a, cache.get('ACGT'))
+        cache.get('TTGA')
+        cache.get('ACGT')       # ACGT is now most recently used
+        cache.get('GGGG')       # evicts TTGA
+        self.assertEqual((2, 3, 2, 2), cache.info())
+        cache.get('TTGA')
+        self.assertEqual((2, 4, 2, 2), cache.info())
+        self.assertIsNot(a, cache.get('ACGT', 'ACGTN'))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+"""bm_search.py: Boyer-Moore, Horspool and Sunday exact matching."""
+
+from bm_preproc import compile_pattern
+
+
+def boyer_moore_search(p, t, p_bm=None, alphabet='ACGT'):
+    """ Return offsets of p in t using the bad character and (weak) good
+        suffix rules.  The tables of p_bm (compiled and cached when not
+        given) are read directly from their flat arrays, and characters of
+        t outside the alphabet (e.g. N) are treated as never occurring in p.
+        p itself must be spelled over the alphabet (else ValueError).
+    Example:
+    >>> boyer_moore_search("GGTAGGT", "GGTAGGTAGGTNGGTAGGT")
+    [0, 4, 12]
+    """
+    m, n = len(p), len(t)
+    if m == 0:
+        return list(range(n + 1))
+    if p_bm is None:
+        p_bm = compile_pattern(p, alphabet)
+    amap, sigma = p_bm.amap, p_bm.sigma
+    bad_char, good_suffix = p_bm.bad_char, p_bm.good_suffix
+    match_shift = p_bm.match_shift
+    occurrences = []
+    i = 0
+    while i <= n - m:
+        j = m - 1
+        while j >= 0 and p[j] == t[i + j]:
+            j -= 1
+        if j < 0:
+            occurrences.append(i)
+            i += match_shift
+            continue
+        ci = amap.get(t[i + j])
+        skip_bc = j + 1 if ci is None else j + 1 - bad_char[j * sigma + ci]
+        skip_gs = good_suffix[j]
+        i += max(1, skip_bc, skip_gs)
+    return occurrences
+
+
+def horspool_shifts(p):
+    """ Return {c: shift} for Horspool: distance from the last occurrence
+        of c in p[:-1] to the end of p; absent characters shift len(p)
+    Example:
+    >>> sorted(horspool_shifts("GGTAG").items())
+    [('A', 1), ('G', 3), ('T', 2)]
+    """
+    m = len(p)
+    return {c: m - 1 - j for j, c in enumerate(p[:-1])}
+
+
+def horspool_search(p, t, shifts=None):
+    """ Return offsets of p in t with Boyer-Moore-Horspool: the shift only
+        depends on the text character aligned with the end of p
+    Example:
+    >>> horspool_search("GGTAGGT", "GGTAGGTAGGTNGGTAGGT")
+    [0, 4, 12]
+    """
+    m, n = len(p), len(t)
+    if m == 0:
+        return list(range(n + 1))
+    if shifts is None:
+        shifts = horspool_shifts(p)
+    last = p[-1]
+    occurrences = []
+    i = 0
+    while i <= n - m:
+        c = t[i + m - 1]
+        if c == last and t[i:i + m] == p:
+            occurrences.append(i)
+        i += shifts.get(c, m)
+    return occurrences
+
+
+def sunday_shifts(p):
+    """ Return {c: shift} for Sunday's Quick Search: len(p) minus the last
+        occurrence of c in p; absent characters shift len(p) + 1
+    Example:
+    >>> sorted(sunday_shifts("GGTAG").items())
+    [('A', 2), ('G', 1), ('T', 3)]
+    """
+    m = len(p)
+    return {c: m - j for j, c in enumerate(p)}
+
+
+def sunday_search(p, t, shifts=None):
+    """ Return offsets of p in t with Sunday's Quick Search, which shifts on
+        the text character just past the window and so can skip len(p) + 1
+    Example:
+    >>> sunday_search("GGTAGGT", "GGTAGGTAGGTNGGTAGGT")
+    [0, 4, 12]
+    """
+    m, n = len(p), len(t)
+    if m == 0:
+        return list(range(n + 1))
+    if shifts is None:
+        shifts = sunday_shifts(p)
+    occurrences = []
+    i = 0
+    while i <= n - m:
+        if t[i:i + m] == p:
+            occurrences.append(i)
+        if i + m >= n:
+            break
+        i += shifts.get(t[i + m], m + 1)
+    return occurrences
+
+
+# Shortest DNA pattern for which boyer_moore beat horspool on chr1 excerpt
+BM_MIN_LENGTH = 48
+
+SEARCHERS = {
+    'boyer_moore': boyer_moore_search,
+    'horspool': horspool_search,
+    'sunday': sunday_search,
+}
+
+
+def choose_method(p, alphabet='ACGT'):
+    """ Pick a variant for p.  Over a small alphabet the bad character
+        shifts stay short, so long patterns (len(p) >= BM_MIN_LENGTH) gain
+        from Boyer-Moore's good suffix rule; otherwise Horspool's single
+        lookup per window is cheapest.  (Sunday's extra character of skip
+        did not pay for its extra lookup on the bundled genomes or on
+        27-letter text, so it is only used when asked for by name.)
+    Example:
+    >>> choose_method("ACGTTGCA"), choose_method("ACGTTGCA" * 8)
+    ('horspool', 'boyer_moore')
+    >>> choose_method("needle" * 10, 'abcdefghijklmnopqrstuvwxyz ')
+    'horspool'
+
+    Boyer-Moore's tables only cover the alphabet, so a pattern with any
+    other character (e.g. N) also goes to Horspool:
+    >>> choose_method("ACGTTGCA" * 8 + "N")
+    'horspool'
+    """
+    if len(alphabet) <= 4 and len(p) >= BM_MIN_LENGTH and \
+            set(p) <= set(alphabet):
+        return 'boyer_moore'
+    return 'horspool'
+
+
+def search(p, t, method='auto', alphabet='ACGT'):
+    """ Return offsets of p in t (a str or PackedSequence) using the named
+        variant, or the one choose_method picks when method is 'auto'
+    Example:
+    >>> from packed_seq import PackedSequence
+    >>> t = PackedSequence("GGTAGGTAGGTNGGTAGGT")
+    >>> [search("GGTAGGT", t, method) for method in sorted(SEARCHERS)]
+    [[0, 4, 12], [0, 4, 12], [0, 4, 12]]
+    >>> from fasta import readGenome
+    >>> for genome in ["lambda_virus.fa", "phix.fa",
+    ...                "chr1.GRCh38.excerpt.fasta"]:
+    ...     t = readGenome(genome)
+    ...     for p in ["AGGT", "ACTAAGTTGA", t[1000:1030], t[-40:]]:
+    ...         expected = [i for i in range(len(t) - len(p) + 1)
+    ...                     if t.startswith(p, i)]
+    ...         for method in ['auto'] + sorted(SEARCHERS):
+    ...             assert search(p, t, method) == expected, (genome, p)
+    """
+    if method == 'auto':
+        method = choose_method(p, alphabet)
+    if method == 'boyer_moore':
+        return boyer_moore_search(p, t, alphabet=alphabet)
+    if method not in SEARCHERS:
+        raise ValueError('unknown search method %r' % method)
+    return SEARCHERS[method](p, t)
+
+
+if __name__ == "__main__":
+    import doctest
+    if doctest.testmod().failed == 0:
+        print("Tests passed.")
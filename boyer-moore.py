@@ -1,4 +1,6 @@
 from bm_preproc import BoyerMoore
+from bm_search import boyer_moore_search
+from fasta import readGenome
 
 
 filename = "chr1.GRCh38.excerpt.fasta"
@@ -6,26 +8,14 @@ filename = "chr1.GRCh38.excerpt.fasta"
 
 def boyer_moore(p, p_bm, t):
     """ Do Boyer-Moore matching. p=pattern, t=text,
-        p_bm=BoyerMoore object for p """
-    i = 0
-    occurrences = []
-    while i < len(t) - len(p) + 1:
-        shift = 1
-        mismatched = False
-        for j in range(len(p) - 1, -1, -1):
-            break
-            if p[j] != t[i + j]:
-                skip_bc = p_bm.bad_character_rule(j, t[i + j])
-                skip_gs = p_bm.good_suffix_rule(j)
-                shift = max(shift, skip_bc, skip_gs)
-                mismatched = True
-                break
-        if not mismatched:
-            occurrences.append(i)
-            skip_gs = p_bm.match_skip()
-            shift = max(shift, skip_gs)
-        i += shift
-    return occurrences
+        p_bm=BoyerMoore object for p
+    Example:
+    >>> p = 'needle'
+    >>> t = 'needle need noodle needle'
+    >>> boyer_moore(p, BoyerMoore(p, 'abcdefghijklmnopqrstuvwxyz '), t)
+    [0, 19]
+    """
+    return boyer_moore_search(p, t, p_bm)
 
 
 def boyer_moore_with_counts(p, p_bm, t):
@@ -57,8 +47,11 @@ def boyer_moore_with_counts(p, p_bm, t):
     >>> print(num_alignments)
     127974
     >>> print(len(p))
+    47
     """
 
+    amap, sigma = p_bm.amap, p_bm.sigma
+    bad_char, good_suffix = p_bm.bad_char, p_bm.good_suffix
     i = 0
     occurrences = []
     num_alignments = 0
@@ -69,16 +62,18 @@ def boyer_moore_with_counts(p, p_bm, t):
 
         for j in range(len(p) - 1, -1, -1):
             if p[j] != t[i + j]:
-                skip_bc = p_bm.bad_character_rule(j, t[i + j])
-                skip_gs = p_bm.good_suffix_rule(j)
+                ci = amap.get(t[i + j])
+                skip_bc = j + 1
+                if ci is not None:
+                    skip_bc -= bad_char[j * sigma + ci]
+                skip_gs = good_suffix[j]
                 shift = max(shift, skip_bc, skip_gs)
                 mismatched = True
                 break
 
         if not mismatched:
             occurrences.append(i)
-            skip_gs = p_bm.match_skip()
-            shift = max(shift, skip_gs)
+            shift = max(shift, p_bm.match_shift)
 
         i += shift
         num_alignments += 1
@@ -106,16 +101,6 @@ def naive(p, t):
     return occurences
 
 
-def readGenome(filename):
-    genome = ''
-    with open(filename, 'r') as f:
-        for line in f:
-            # ignore header line with genome information
-            if not line[0] == '>':
-                genome += line.rstrip()
-    return genome
-
-
 def naive_with_counts(p, t):
     """
     Returns occurences, # alignments done and # characters matched
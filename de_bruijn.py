@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+"""de_bruijn.py: De Bruijn graph assembly over 2-bit packed k-mers."""
+
+import sys
+
+from fastq import iter_fastq_batches
+from packed_seq import ALPHABET, decode_kmer, encode, iter_kmer_codes
+
+
+class DeBruijnGraph(object):
+    """ De Bruijn graph of the k-mers of a set of reads.  Every k-mer is an
+        edge from its (k-1)-mer prefix to its (k-1)-mer suffix.  Only one
+        hash table, k-mer code -> multiplicity, grows with the input, so
+        memory depends on the number of distinct k-mers and not on how many
+        reads were added.  Nodes are (k-1)-mer codes mapped to a byte:
+        bit c (0-3) means an edge to node + ALPHABET[c], bit 4 + c an edge
+        from ALPHABET[c] + node.  K-mers seen fewer than min_count times
+        (typically sequencing errors) are left out of the graph.  Reads are
+        taken as given (one strand); k-mers overlapping an N are skipped.
+    Example:
+    >>> g = DeBruijnGraph(4)
+    >>> g.add_sequence("ACGTTGCA")
+    >>> len(g.kmers), sorted(decode_kmer(v, 3) for v in g.nodes())
+    (5, ['ACG', 'CGT', 'GCA', 'GTT', 'TGC', 'TTG'])
+    """
+
+    def __init__(self, k, min_count=1):
+        if k < 2:
+            raise ValueError('k must be at least 2')
+        self.k = k
+        self.min_count = min_count
+        self.kmers = {}
+        self._nodes = None
+
+    def add_sequence(self, seq):
+        """ Count the k-mers of one read """
+        kmers = self.kmers
+        for _, code in iter_kmer_codes(encode(seq), self.k):
+            kmers[code] = kmers.get(code, 0) + 1
+        self._nodes = None
+
+    def add_fastq(self, filename, batch_size=10000):
+        """ Count the k-mers of every read of a FASTQ file, streaming it in
+            batches """
+        for batch in iter_fastq_batches(filename, batch_size):
+            for _, seq, _ in batch:
+                self.add_sequence(seq)
+
+    def nodes(self):
+        """ Return {node code: edge bits} over k-mers seen min_count times """
+        if self._nodes is None:
+            shift = 2 * (self.k - 1)
+            node_mask = (1 << shift) - 1
+            nodes = {}
+            for code, count in self.kmers.items():
+                if count < self.min_count:
+                    continue
+                left, right = code >> 2, code & node_mask
+                nodes[left] = nodes.get(left, 0) | (1 << (code & 3))
+                nodes[right] = nodes.get(right, 0) | (16 << (code >> shift))
+            self._nodes = nodes
+        return self._nodes
+
+    def unitigs(self):
+        """ Yield maximal non-branching paths as strings.  Paths start at
+            every node that does not have exactly one edge in and one out,
+            and extend through nodes that do; cycles made only of such
+            nodes are emitted once from their smallest node.
+        Example:
+        >>> g = DeBruijnGraph(3)
+        >>> g.add_sequence("AAGCTTGCA")
+        >>> sorted(g.unitigs())
+        ['AAGC', 'GCA', 'GCTTGC']
+        """
+        nodes = self.nodes()
+        k1 = self.k - 1
+        node_mask = (1 << (2 * k1)) - 1
+        used = set()  # k-mer codes already placed in a unitig
+
+        def simple(v):
+            bits = nodes[v]
+            return _ONE_BIT[bits & 15] and _ONE_BIT[bits >> 4]
+
+        def walk(v, c):
+            """ Follow edge v -> v+c and onwards while nodes are simple """
+            bases = []
+            while True:
+                code = (v << 2) | c
+                if code in used:
+                    break
+                used.add(code)
+                bases.append(ALPHABET[c])
+                v = code & node_mask
+                if not simple(v):
+                    break
+                c = _ONLY_BIT[nodes[v] & 15]
+            return bases
+
+        for v in sorted(nodes):
+            if simple(v):
+                continue
+            out = nodes[v] & 15
+            for c in range(4):
+                if out & (1 << c) and (v << 2 | c) not in used:
+                    yield decode_kmer(v, k1) + ''.join(walk(v, c))
+        for v in sorted(nodes):  # isolated cycles
+            if not simple(v):
+                continue
+            c = _ONLY_BIT[nodes[v] & 15]
+            if (v << 2 | c) not in used:
+                yield decode_kmer(v, k1) + ''.join(walk(v, c))
+
+    def contigs(self, min_length=0):
+        """ Return the unitigs at least min_length long, longest first """
+        return sorted((u for u in self.unitigs() if len(u) >= min_length),
+                      key=lambda u: (-len(u), u))
+
+
+# 4-bit edge mask -> whether exactly one bit is set / the index of that bit
+_ONE_BIT = [bin(b).count('1') == 1 for b in range(16)]
+_ONLY_BIT = [b.bit_length() - 1 for b in range(16)]
+
+
+def write_fasta(contigs, out, prefix='contig', width=60):
+    """ Write contigs to out as FASTA records named prefix_1, prefix_2, ... """
+    for i, contig in enumerate(contigs, 1):
+        out.write('>%s_%d length=%d\n' % (prefix, i, len(contig)))
+        for j in range(0, len(contig), width):
+            out.write(contig[j:j + width])
+            out.write('\n')
+
+
+def assemble_fastq(filename, k, min_count=2, min_length=0):
+    """ Return the contigs of a de Bruijn graph built from a FASTQ file
+    Example:
+    >>> contigs = assemble_fastq("ads1_week4_reads.fq", 30, min_count=1)
+    >>> len(contigs), len(contigs[0])
+    (1, 15894)
+    """
+    graph = DeBruijnGraph(k, min_count)
+    graph.add_fastq(filename)
+    return graph.contigs(min_length)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        # de_bruijn.py reads.fastq k > contigs.fasta
+        write_fasta(assemble_fastq(sys.argv[1], int(sys.argv[2])), sys.stdout)
+    else:
+        import doctest
+        if doctest.testmod().failed == 0:
+            print("Tests passed.")
@@ -1,65 +1,94 @@
-filename = "chr1.GRCh38.excerpt.fasta"
+from array import array
 
+from fasta import readGenome
 
-def readGenome(file):
-    genome = ""
-    with open(file, 'r') as f:
-        for line in f:
-            if not line[0] == ">":
-                genome += line.rstrip()
-    return genome
 
+filename = "chr1.GRCh38.excerpt.fasta"
 
 
-def edit_distance(p, t):
+def edit_distance(p, t, k=None):
     """
-    Returns the edit distance between pattern, p and 
-    text, t using dynamic programming. 
+    Returns the edit distance between pattern, p and
+    text, t using dynamic programming.
+    Only two rows of the matrix are kept. If k is given, only the
+    diagonal band |i - j| <= k is filled in, and k + 1 is returned as
+    soon as the distance is known to exceed k.
     Example:
     >>> p = "shake spea"
     >>> t = "Shakespear"
     >>> edit_distance(p, t)
     3
+    >>> edit_distance(p, t, k=3)
+    3
+    >>> edit_distance(p, t, k=2)
+    3
     """
-    matrix = []
-    # Matrix will be a list of lists:
-    # [[0][0], [0][1], ...]
-    for i in range(len(p) + 1):
-        matrix.append([0] * (len(t) + 1))
-
-    # Initializing the first row and column:
-    for i in range(len(p) + 1):
-        matrix[i][0] = i
-
-    for i in range(len(t) + 1):
-        matrix[0][i] = i
-    # Fill in the rest of the matrix:
+    n = len(t)
+    if k is not None and abs(len(p) - n) > k:
+        return k + 1
+    # Cells outside the band hold this cap, which is larger than any
+    # in-band value that can still lead to a distance <= k
+    cap = len(p) + n + 1 if k is None else k + 1
+    # Initializing the first row:
+    prev = array('l', range(n + 1))
+    if k is not None:
+        for j in range(k + 1, n + 1):
+            prev[j] = cap
+    cur = array('l', [cap]) * (n + 1)
+    # Fill in the rest of the matrix, one row at a time:
     for i in range(1, len(p) + 1):
-        for j in range(1, len(t) + 1):
-            dist_hor = matrix[i][j - 1] + 1
-            dist_vert = matrix[i - 1][j] + 1
-
-            if p[i - 1] == t[j - 1]:
-                dist_diag = matrix[i - 1][j - 1]
+        lo, hi = 1, n
+        if k is not None:
+            lo, hi = max(1, i - k), min(n, i + k)
+            if lo > 1:
+                cur[lo - 1] = cap
+        cur[0] = i if lo == 1 else cap
+        pc = p[i - 1]
+        row_min = cur[lo - 1]
+        for j in range(lo, hi + 1):
+            dist_hor = cur[j - 1] + 1
+            dist_vert = prev[j] + 1
+
+            if pc == t[j - 1]:
+                dist_diag = prev[j - 1]
             else:
-                dist_diag = matrix[i - 1][j - 1] + 1
-
-            matrix[i][j] = min(dist_hor, dist_vert, dist_diag)
+                dist_diag = prev[j - 1] + 1
+
+            d = min(dist_hor, dist_vert, dist_diag)
+            cur[j] = d
+            if d < row_min:
+                row_min = d
+        if k is not None:
+            if hi < n:
+                cur[hi + 1] = cap
+            # Every cell in this row is already above k: stop early
+            if row_min > k:
+                return k + 1
+        prev, cur = cur, prev
 
     # Return the edit distance between the two strings.
     # This would be the last element in the matrix.
-    return matrix[-1][-1]
+    if k is not None and prev[n] > k:
+        return k + 1
+    return prev[n]
 
 
-def edit_distance_approx(p, t):
+def edit_distance_approx(p, t, k=None):
     """
-    Returns the edit distance between pattern, p and 
-    text, t using dynamic programming. 
+    Returns the edit distance between pattern, p and
+    text, t using dynamic programming.
+    The matrix is filled in one column per character of t, keeping only
+    two columns of len(p) + 1 cells, so memory does not grow with t.
+    If k is given, each column is only computed down to the last row
+    that can still be <= k (Ukkonen's cut-off), and k + 1 is returned
+    when no approximate occurrence within k exists.
     Example 1:
     >>> p = "GCGTATGC"
     >>> t = "TATTGGCTATACGGTT"
     >>> edit_distance_approx(p, t)
     2
+    >>> edit_distance_approx(p, t, k=1)
+    2
 
     Example 2:
     >>> p = "GCTGATCGATCGTACG"
@@ -72,41 +101,50 @@ def edit_distance_approx(p, t):
     >>> human_chr1 = readGenome("chr1.GRCh38.excerpt.fasta")
     >>> edit_distance_approx(p, human_chr1)
     2
+    >>> edit_distance_approx(p, human_chr1, k=2)
+    2
 
     """
-    matrix = []
-    # Matrix will be a list of lists:
-    # [[0][0], [0][1], ...]
-    for i in range(len(p) + 1):
-        matrix.append([0] * (len(t) + 1))
-
-    # Initializing the first row and column:
-    for i in range(len(p) + 1):
-        matrix[i][0] = i
-
-    for i in range(len(t) + 1):
-        matrix[0][i] = 0
-    # Fill in the rest of the matrix:
-    for i in range(1, len(p) + 1):
-        for j in range(1, len(t) + 1):
-            dist_hor = matrix[i][j - 1] + 1
-            dist_vert = matrix[i - 1][j] + 1
-
-            if p[i - 1] == t[j - 1]:
-                dist_diag = matrix[i - 1][j - 1]
+    m = len(p)
+    cap = m + 1 if k is None else min(k + 1, m + 1)
+    # Initializing the first column (the first row is all 0):
+    prev = array('l', range(m + 1))
+    for i in range(cap, m + 1):
+        prev[i] = cap
+    cur = array('l', [cap]) * (m + 1)
+    cur[0] = 0
+    # Last row whose value may still be <= k
+    last = m if k is None else min(k, m)
+    best = prev[m]
+    for c in t:
+        if best == 0:
+            break  # an exact occurrence; nothing can beat it
+        bottom = min(last + 1, m)
+        for i in range(1, bottom + 1):
+            dist_hor = prev[i] + 1
+            dist_vert = cur[i - 1] + 1
+
+            if p[i - 1] == c:
+                dist_diag = prev[i - 1]
             else:
-                dist_diag = matrix[i - 1][j - 1] + 1
-
-            matrix[i][j] = min(dist_hor, dist_vert, dist_diag)
-
-    # Return the edit distance between the two strings.
-    # This would be the last element in the matrix.
-    i = len(p)
-    last_row = []
-    for j in range(len(t) + 1):
-        last_row.append(matrix[i][j])
-
-    return min(last_row)
+                dist_diag = prev[i - 1] + 1
+
+            d = min(dist_hor, dist_vert, dist_diag)
+            cur[i] = d if d < cap else cap
+        if bottom < m:
+            cur[bottom + 1] = cap
+        if k is not None:
+            last = bottom
+            while cur[last] > k:
+                last -= 1
+        if bottom == m and cur[m] < best:
+            best = cur[m]
+        prev, cur = cur, prev
+
+    # Return the smallest value in the last row.
+    if k is not None and best > k:
+        return k + 1
+    return best
 
 
 if __name__ == "__main__":
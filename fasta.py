@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+"""fasta.py: Memory-mapped FASTA loader with a .fai-style index."""
+
+import mmap
+import os
+from collections import OrderedDict, namedtuple
+
+# One line of a samtools-compatible .fai file: sequence length, file offset
+# of the first base, bases per line and bytes per line (incl. newline).
+FaiEntry = namedtuple('FaiEntry', ['length', 'offset', 'linebases',
+                                   'linewidth'])
+
+
+class FastaFile(object):
+    """ Random access to the records of a (possibly multi-record) FASTA file.
+        The file is memory-mapped; the name -> offset table is read from
+        filename.fai when it is up to date, otherwise built on first use and
+        written back so the next open costs nothing. """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.fai_filename = filename + '.fai'
+        self._fh = open(filename, 'rb')
+        if os.fstat(self._fh.fileno()).st_size == 0:
+            self._mm = b''  # mmap refuses empty files
+        else:
+            self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            try:
+                self._mm.close()
+            except BufferError:
+                pass  # a sequence() view is still alive; unmapped on release
+        self._fh.close()
+
+    @property
+    def index(self):
+        """ OrderedDict of record name -> FaiEntry, loaded lazily """
+        if self._index is None:
+            self._index = self._load_fai()
+            if self._index is None:
+                self._index = self._build_fai()
+                self._write_fai()
+        return self._index
+
+    @property
+    def names(self):
+        return list(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def _load_fai(self):
+        """ Return the index stored in the .fai file, or None when there is
+            no such file, it is older than the FASTA file or it does not fit
+            the file's layout (see _fai_matches). """
+        try:
+            if os.path.getmtime(self.fai_filename) < \
+                    os.path.getmtime(self.filename):
+                return None
+            index = OrderedDict()
+            with open(self.fai_filename) as fh:
+                for line in fh:
+                    fields = line.rstrip('\n').split('\t')
+                    index[fields[0]] = FaiEntry(*map(int, fields[1:5]))
+            return index if self._fai_matches(index) else None
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _fai_matches(self, index):
+        """ Check index against the mapped file: every record must end
+            where the next header (or, for the last, the end of the file
+            after trailing newlines) begins.  This catches a FASTA rewritten
+            without its modification time moving past the .fai's.
+        Example:
+        >>> import tempfile
+        >>> fname = os.path.join(tempfile.mkdtemp(), 'g.fa')
+        >>> with open(fname, 'w') as fh:
+        ...     _ = fh.write('>g\\nACGT\\n')
+        >>> readGenome(fname)
+        'ACGT'
+        >>> stamp = os.path.getmtime(fname + '.fai')
+        >>> with open(fname, 'w') as fh:
+        ...     _ = fh.write('>g\\nACGTAAAA\\n')
+        >>> os.utime(fname, (stamp, stamp))
+        >>> readGenome(fname)
+        'ACGTAAAA'
+        """
+        mm = self._mm
+        entries = list(index.values())
+        for i, e in enumerate(entries):
+            if not e.length:
+                end = min(e.offset, len(mm))
+            elif 0 < e.offset <= len(mm) and mm[e.offset - 1] == 10:
+                end = self._file_offset(e, e.length - 1) + 1
+            else:
+                return False  # a record's bases follow its header line
+            if end > len(mm):
+                return False
+            stop = entries[i + 1].offset if i + 1 < len(entries) else len(mm)
+            rest = mm[end:stop].lstrip(b'\r\n')
+            if i + 1 < len(entries) and not rest.startswith(b'>') or \
+                    i + 1 == len(entries) and rest:
+                return False
+        return True
+
+    def _write_fai(self):
+        try:
+            with open(self.fai_filename, 'w') as fh:
+                for name, e in self.index.items():
+                    fh.write('%s\t%d\t%d\t%d\t%d\n' % (name, e.length, e.offset,
+                                                       e.linebases, e.linewidth))
+        except OSError:
+            pass  # read-only location; index stays in memory only
+
+    def _build_fai(self):
+        """ Scan the mapped file once, line by line, recording where each
+            record's bases start and how its lines are wrapped. """
+        mm = self._mm
+        size = len(mm)
+        index = OrderedDict()
+        pos = 0
+        while pos < size:
+            if mm[pos] != 62:  # '>'
+                raise ValueError("%s: expected '>' at byte %d"
+                                 % (self.filename, pos))
+            eol = mm.find(b'\n', pos)
+            if eol == -1:
+                eol = size
+            header = mm[pos + 1:eol].decode('ascii').strip()
+            name = header.split()[0] if header else ''
+            offset = eol + 1
+            length = linebases = linewidth = 0
+            short_line = False
+            pos = offset
+            while pos < size and mm[pos] != 62:
+                eol = mm.find(b'\n', pos)
+                if eol == -1:
+                    eol = size
+                end = eol
+                if end > pos and mm[end - 1] == 13:  # '\r'
+                    end -= 1
+                nbases = end - pos
+                if nbases:
+                    if short_line:
+                        raise ValueError("%s: record %s has lines of "
+                                         "differing length" % (self.filename,
+                                                               name))
+                    if linebases == 0:
+                        linebases, linewidth = nbases, eol + 1 - pos
+                    elif nbases != linebases:
+                        short_line = True
+                        if nbases > linebases:
+                            raise ValueError("%s: record %s has lines of "
+                                             "differing length"
+                                             % (self.filename, name))
+                    length += nbases
+                else:
+                    short_line = True  # blank line; only legal at the end
+                pos = eol + 1
+            index[name] = FaiEntry(length, offset, linebases, linewidth)
+        return index
+
+    def _file_offset(self, entry, i):
+        """ Byte offset in the file of base i of a record """
+        if entry.linebases == 0:
+            return entry.offset
+        return entry.offset + (i // entry.linebases) * entry.linewidth + \
+            i % entry.linebases
+
+    def fetch(self, name, start=0, end=None):
+        """ Return bases [start, end) of record name as bytes """
+        entry = self.index[name]
+        if end is None or end > entry.length:
+            end = entry.length
+        if start >= end:
+            return b''
+        lo = self._file_offset(entry, start)
+        hi = self._file_offset(entry, end - 1) + 1
+        return self._mm[lo:hi].translate(None, b'\r\n')
+
+    def sequence(self, name):
+        """ Return the bases of record name as a bytes-like object.  A record
+            stored on a single line comes back as a zero-copy memoryview of
+            the mapping; a wrapped record is copied once with its newlines
+            removed. """
+        entry = self.index[name]
+        if entry.length == entry.linebases:
+            return memoryview(self._mm)[entry.offset:entry.offset + entry.length]
+        return self.fetch(name)
+
+
+def readGenome(filename):
+    """ Return the concatenated bases of every record in a FASTA file.
+    Example:
+    >>> genome = readGenome("phix.fa")
+    >>> len(genome), genome[:10]
+    (5386, 'GAGTTTTATC')
+    """
+    with FastaFile(filename) as fa:
+        return b''.join([fa.fetch(name) for name in fa.index]).decode('ascii')
+
+
+if __name__ == "__main__":
+    import doctest
+    if doctest.testmod().failed == 0:
+        print("Tests passed.")
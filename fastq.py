@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""fastq.py: Streaming FASTQ reader shared by the scripts."""
+
+import gzip
+
+BLOCK_SIZE = 1 << 20  # bytes pulled from the file per read() call
+NEWLINE = ord('\n')
+AT = ord('@')
+PLUS = ord('+')
+
+
+def open_fastq(filename):
+    """ Open filename for binary reading.  gzip input is recognised by its
+        magic bytes rather than its extension and decompressed on the fly. """
+    with open(filename, 'rb') as fh:
+        magic = fh.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def _line_end(buf, start, end):
+    """ Return the offset just past the line content starting at start,
+        dropping a trailing carriage return. """
+    if end > start and buf[end - 1] == 13:  # '\r'
+        return end - 1
+    return end
+
+
+def iter_fastq(filename, block_size=BLOCK_SIZE):
+    """ Yield (name, seq, qual) for every record in a FASTQ file.
+        The file is read in large blocks and each record is cut out of the
+        block by offset; the '@' and '+' lines are checked in place, so only
+        the three returned strings are allocated per record.
+    Example:
+    >>> records = iter_fastq("ERR037900_1.first1000.fastq")
+    >>> name, seq, qual = next(records)
+    >>> name
+    'ERR037900.1 509.8.8.8903.80024/1'
+    >>> seq[:20], qual[:20]
+    ('TAACCCTAACCCTAACCCTA', 'HHHHHHHHHHHHHHHHHHHH')
+    >>> sum(1 for _ in records)
+    999
+    """
+    with open_fastq(filename) as fh:
+        buf = b''
+        pos = 0
+        record = 0
+        eof = False
+        while not eof:
+            block = fh.read(block_size)
+            if not block:
+                eof = True
+                if pos < len(buf) and buf[-1] != NEWLINE:
+                    block = b'\n'  # tolerate a missing final newline
+            buf = buf[pos:] + block
+            pos = 0
+            while True:
+                nl1 = buf.find(b'\n', pos)
+                if nl1 == -1:
+                    break
+                nl2 = buf.find(b'\n', nl1 + 1)
+                if nl2 == -1:
+                    break
+                nl3 = buf.find(b'\n', nl2 + 1)
+                if nl3 == -1:
+                    break
+                nl4 = buf.find(b'\n', nl3 + 1)
+                if nl4 == -1:
+                    break
+                record += 1
+                if buf[pos] != AT:
+                    raise ValueError("FASTQ record %d does not start with '@'"
+                                     % record)
+                if buf[nl2 + 1] != PLUS:
+                    raise ValueError("FASTQ record %d has no '+' separator"
+                                     % record)
+                seq_end = _line_end(buf, nl1 + 1, nl2)
+                qual_end = _line_end(buf, nl3 + 1, nl4)
+                if seq_end - nl1 != qual_end - nl3:
+                    raise ValueError("FASTQ record %d: sequence and quality "
+                                     "lengths differ" % record)
+                yield (buf[pos + 1:_line_end(buf, pos + 1, nl1)].decode('ascii'),
+                       buf[nl1 + 1:seq_end].decode('ascii'),
+                       buf[nl3 + 1:qual_end].decode('ascii'))
+                pos = nl4 + 1
+        if buf[pos:].strip():
+            raise ValueError("FASTQ file ends with a truncated record")
+
+
+def iter_fastq_batches(filename, batch_size=10000, block_size=BLOCK_SIZE):
+    """ Yield lists of at most batch_size (name, seq, qual) records.
+    Example:
+    >>> [len(b) for b in iter_fastq_batches("ERR037900_1.first1000.fastq", 400)]
+    [400, 400, 200]
+    """
+    batch = []
+    for rec in iter_fastq(filename, block_size):
+        batch.append(rec)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_sequences(filename, block_size=BLOCK_SIZE):
+    """ Yield just the base sequence of every record.
+    Example:
+    >>> next(iter_sequences("ads1_week4_reads.fq"))[:10]
+    'GTCCAGCAGA'
+    """
+    for _, seq, _ in iter_fastq(filename, block_size):
+        yield seq
+
+
+if __name__ == "__main__":
+    import doctest
+    if doctest.testmod().failed == 0:
+        print("Tests passed.")
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+"""fastq_qc.py: Streaming per-cycle base and quality statistics for FASTQ."""
+
+import numpy as np
+
+from fastq import iter_fastq_batches
+
+BASES = 'ACGTN'
+N_INDEX = 4
+MAX_PHRED = 93  # highest score printable with offset 33
+
+# byte -> index into BASES; anything unexpected (IUPAC codes, '.') counts as N
+BASE_INDEX = np.full(256, N_INDEX, dtype=np.int64)
+for _i, _c in enumerate(BASES):
+    BASE_INDEX[ord(_c)] = BASE_INDEX[ord(_c.lower())] = _i
+
+
+def _pad_rows(a, rows):
+    """ Return a with zero rows appended up to rows rows """
+    if a.shape[0] >= rows:
+        return a
+    out = np.zeros((rows,) + a.shape[1:], dtype=a.dtype)
+    out[:a.shape[0]] = a
+    return out
+
+
+class CycleStats(object):
+    """ Per-cycle (read position, counted from 0) base counts, N counts
+        and Phred quality histograms, accumulated one batch of (name, seq,
+        qual) records at a time.  Reads may differ in length: cycle i only
+        counts reads longer than i, and the arrays grow to the longest read
+        seen.  Statistics of separate shards of a run combine with merge().
+    Example:
+    >>> stats = CycleStats()
+    >>> stats.update([("r1", "ACGN", "II#I"), ("r2", "ACG", "II5")])
+    >>> stats.base_counts.tolist()
+    [[2, 0, 0, 0, 0], [0, 2, 0, 0, 0], [0, 0, 2, 0, 0], [0, 0, 0, 0, 1]]
+    >>> stats.reads, stats.coverage().tolist(), stats.n_counts().tolist()
+    (2, [2, 2, 2, 1], [0, 0, 0, 1])
+    >>> stats.mean_quality().tolist()
+    [40.0, 40.0, 11.0, 40.0]
+    >>> stats.update([("r3", "ACGT", "II I")])
+    Traceback (most recent call last):
+    ...
+    ValueError: quality character out of range for offset 33
+    >>> stats.update([("r3", "ACGT", "III"), ("r4", "AC", "III")])
+    Traceback (most recent call last):
+    ...
+    ValueError: sequence and quality lengths differ for 'r3'
+    >>> stats.reads, stats.coverage().tolist()
+    (2, [2, 2, 2, 1])
+    """
+
+    def __init__(self, phred_offset=33):
+        self.phred_offset = phred_offset
+        self.reads = 0
+        self.base_counts = np.zeros((0, len(BASES)), dtype=np.int64)
+        self.qual_hist = np.zeros((0, MAX_PHRED + 1), dtype=np.int64)
+        self.length_hist = np.zeros(0, dtype=np.int64)
+
+    @property
+    def cycles(self):
+        return self.base_counts.shape[0]
+
+    def _grow(self, cycles):
+        self.base_counts = _pad_rows(self.base_counts, cycles)
+        self.qual_hist = _pad_rows(self.qual_hist, cycles)
+        self.length_hist = _pad_rows(self.length_hist, cycles + 1)
+
+    def update(self, records):
+        """ Add a batch of (name, seq, qual) records.  All reads of the batch
+            are concatenated so each statistic is one bincount. """
+        if not records:
+            return
+        lengths = np.array([len(seq) for _, seq, _ in records], dtype=np.int64)
+        cycles = int(lengths.max())
+        seq = np.frombuffer(''.join(r[1] for r in records).encode('ascii'),
+                            dtype=np.uint8)
+        qual = np.frombuffer(''.join(r[2] for r in records).encode('ascii'),
+                             dtype=np.uint8)
+        # Validate the whole batch before touching any counts, so a rejected
+        # batch leaves the statistics as they were
+        for name, s, q in records:
+            if len(s) != len(q):
+                raise ValueError('sequence and quality lengths differ for %r'
+                                 % name)
+        phred = qual.astype(np.int64) - self.phred_offset
+        if len(phred) and (phred.min() < 0 or phred.max() > MAX_PHRED):
+            raise ValueError('quality character out of range for offset %d'
+                             % self.phred_offset)
+        self._grow(cycles)
+        self.reads += len(records)
+        self.length_hist[:cycles + 1] += np.bincount(lengths,
+                                                     minlength=cycles + 1)
+        # cycle of every base: its offset minus the start of its read
+        starts = np.cumsum(lengths) - lengths
+        cycle = np.arange(len(seq)) - np.repeat(starts, lengths)
+        nbases = len(BASES)
+        self.base_counts[:cycles] += np.bincount(
+            cycle * nbases + BASE_INDEX[seq],
+            minlength=cycles * nbases).reshape(cycles, nbases)
+        nq = MAX_PHRED + 1
+        self.qual_hist[:cycles] += np.bincount(
+            cycle * nq + phred, minlength=cycles * nq).reshape(cycles, nq)
+
+    def merge(self, other):
+        """ Add the counts of other (e.g. another shard) into self
+        Example:
+        >>> a, b = CycleStats(), CycleStats()
+        >>> a.update([("r1", "ACGT", "IIII")])
+        >>> b.update([("r2", "ACGTAC", "IIIIII")])
+        >>> a.merge(b)
+        >>> a.reads, a.cycles, a.coverage().tolist()
+        (2, 6, [2, 2, 2, 2, 1, 1])
+        """
+        if other.phred_offset != self.phred_offset:
+            raise ValueError('cannot merge statistics with different '
+                             'Phred offsets')
+        self._grow(other.cycles)
+        self.reads += other.reads
+        self.base_counts[:other.cycles] += other.base_counts
+        self.qual_hist[:other.cycles] += other.qual_hist
+        self.length_hist[:len(other.length_hist)] += other.length_hist
+
+    def coverage(self):
+        """ Number of reads that reach each cycle """
+        return self.base_counts.sum(axis=1)
+
+    def n_counts(self):
+        return self.base_counts[:, N_INDEX]
+
+    def mean_quality(self):
+        scores = np.arange(MAX_PHRED + 1)
+        cov = np.maximum(self.qual_hist.sum(axis=1), 1)
+        return (self.qual_hist * scores).sum(axis=1) / cov
+
+    def quality_quantile(self, q):
+        """ Per-cycle Phred score below which a fraction q of bases lie """
+        cum = np.cumsum(self.qual_hist, axis=1)
+        target = q * cum[:, -1:]
+        return (cum < target).sum(axis=1)
+
+    def bad_cycles(self, min_mean_quality=20, max_n_fraction=0.05,
+                   max_base_skew=0.2):
+        """ Return [(cycle, {check: value})] for cycles whose mean quality
+            is below min_mean_quality ('quality'), whose fraction of N
+            exceeds max_n_fraction ('N'), or whose A/C/G/T composition
+            differs from the run-wide composition by more than
+            max_base_skew for some base ('skew') """
+        cov = np.maximum(self.coverage(), 1)
+        mean_q = self.mean_quality()
+        n_frac = self.n_counts() / cov
+        acgt = self.base_counts[:, :N_INDEX].astype(float)
+        frac = acgt / np.maximum(acgt.sum(axis=1, keepdims=True), 1)
+        overall = acgt.sum(axis=0) / max(acgt.sum(), 1)
+        skew = np.abs(frac - overall).max(axis=1)
+        flagged = []
+        for i in range(self.cycles):
+            failed = {}
+            if mean_q[i] < min_mean_quality:
+                failed['quality'] = float(mean_q[i])
+            if n_frac[i] > max_n_fraction:
+                failed['N'] = float(n_frac[i])
+            if skew[i] > max_base_skew:
+                failed['skew'] = float(skew[i])
+            if failed:
+                flagged.append((i, failed))
+        return flagged
+
+    def report(self, **thresholds):
+        """ Return a short text summary.  Cycles are numbered from 0, as in
+            bad_cycles().  Runs of adjacent bad cycles that
+            fail the same checks share one line, giving the worst value of
+            each check; thresholds are passed on to bad_cycles. """
+        lengths = np.nonzero(self.length_hist)[0]
+        lines = ['reads %d, cycles %d, read length %s, mean quality %.1f, '
+                 'N %d' % (self.reads, self.cycles,
+                           '%d-%d' % (lengths[0], lengths[-1])
+                           if len(lengths) else '-',
+                           (self.qual_hist * np.arange(MAX_PHRED + 1)).sum()
+                           / max(self.qual_hist.sum(), 1),
+                           self.n_counts().sum())]
+        runs = []
+        for i, failed in self.bad_cycles(**thresholds):
+            if runs and runs[-1][1] == i - 1 and \
+                    sorted(runs[-1][2]) == sorted(failed):
+                runs[-1][1] = i
+                worst = runs[-1][2]
+                for check, value in failed.items():
+                    if check == 'quality':
+                        worst[check] = min(worst[check], value)
+                    else:
+                        worst[check] = max(worst[check], value)
+            else:
+                runs.append([i, i, dict(failed)])
+        if not runs:
+            lines.append('no bad cycles')
+        for first, last, worst in runs:
+            where = 'cycle %d' % first if first == last else \
+                'cycles %d-%d' % (first, last)
+            found = []
+            if 'quality' in worst:
+                found.append('mean quality %.1f' % worst['quality'])
+            if 'N' in worst:
+                found.append('N %.1f%%' % (100 * worst['N']))
+            if 'skew' in worst:
+                found.append('base skew %.2f' % worst['skew'])
+            lines.append('%s: %s' % (where, ', '.join(found)))
+        return '\n'.join(lines)
+
+
+def qc_fastq(filename, batch_size=10000, phred_offset=33):
+    """ Return the CycleStats of every read in a FASTQ file
+    Example:
+    >>> stats = qc_fastq("ERR037900_1.first1000.fastq", batch_size=300)
+    >>> print(stats.report())
+    reads 1000, cycles 100, read length 100-100, mean quality 29.6, N 914
+    cycle 65: mean quality 17.9
+    cycle 66: mean quality 4.5, N 90.3%
+    cycles 67-74: mean quality 16.9
+    cycles 83-99: mean quality 11.6
+    """
+    stats = CycleStats(phred_offset)
+    for batch in iter_fastq_batches(filename, batch_size):
+        stats.update(batch)
+    return stats
+
+
+if __name__ == "__main__":
+    import doctest
+    if doctest.testmod().failed == 0:
+        print("Tests passed.")
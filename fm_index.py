@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+"""fm_index.py: FM-index (BWT + checkpointed Occ + sampled SA)."""
+
+import bisect
+from array import array
+
+from packed_seq import PackedSequence, normalize
+from suffix_array import suffix_array
+
+
+class FMIndex(object):
+    """ Holds an FM-index for a text T.  The BWT of T$ is stored 2-bit
+        packed (the single '$' is kept as a row number), occurrence counts
+        are checkpointed every occ_rate rows and the suffix array is kept
+        only for text offsets divisible by sa_rate.  count() is a backward
+        search; query() additionally walks LF from each row to the nearest
+        sampled offset.  With the default k=0 query() matches the whole
+        pattern, so queryIndex and pigeon_hole_index_matching accept it.
+        T and patterns are read as a PackedSequence would read them (see
+        packed_seq.normalize): soft-masked bases match their upper case
+        and any other non-ACGT character is an N.
+    Example:
+    >>> FMIndex("acgtACGT").query("ACG"), FMIndex("ACRTACGYAC").count("AC")
+    ([0, 4], 3)
+    """
+
+    def __init__(self, t, occ_rate=128, sa_rate=32, k=0):
+        t = str(t) if isinstance(t, PackedSequence) else normalize(t)
+        self.n = len(t)
+        self.k = k
+        self.occ_rate = occ_rate
+        self.sa_rate = sa_rate
+        typecode = 'I' if self.n < 2 ** 32 else 'Q'
+        sa = array('l', [self.n]) + suffix_array(t)  # '$' sorts first
+        self.dollar_row = sa.index(0)
+        # The '$' is packed as an 'A' and patched back in by _bwt_str
+        self.bwt = PackedSequence(''.join([t[s - 1] if s else 'A' for s in sa]))
+        # C[c]: number of characters in T$ that sort before c
+        self.alphabet = sorted(set(t))
+        self.first = {}
+        total = 1  # the '$'
+        for c in self.alphabet:
+            self.first[c] = total
+            total += t.count(c)
+        # Occ checkpoints: occ[c][j] = # of c in bwt[:j * occ_rate]
+        self.occ = {c: array(typecode, [0]) for c in self.alphabet}
+        for j in range(occ_rate, len(sa) + 1, occ_rate):
+            block = self._bwt_str(j - occ_rate, j)
+            for c in self.alphabet:
+                self.occ[c].append(self.occ[c][-1] + block.count(c))
+        # Sampled SA: rows whose suffix offset is a multiple of sa_rate
+        self.sa_rows = array(typecode)
+        self.sa_vals = array(typecode)
+        for row, s in enumerate(sa):
+            if s % sa_rate == 0:
+                self.sa_rows.append(row)
+                self.sa_vals.append(s)
+
+    def _bwt_str(self, lo, hi):
+        """ Return BWT rows [lo, hi) as a str, '$' included """
+        s = self.bwt[lo:hi]
+        if lo <= self.dollar_row < hi:
+            i = self.dollar_row - lo
+            s = s[:i] + '$' + s[i + 1:]
+        return s
+
+    def _occ(self, c, i):
+        """ Return the number of c in bwt[:i] """
+        j = i // self.occ_rate
+        lo = j * self.occ_rate
+        return self.occ[c][j] + self._bwt_str(lo, i).count(c)
+
+    def _lf(self, row):
+        """ LF mapping: row of the suffix one character to the left """
+        c = self.bwt[row]
+        return self.first[c] + self._occ(c, row)
+
+    def _range(self, p):
+        """ Backward search: return [lo, hi) rows prefixed by p """
+        lo, hi = 0, self.n + 1
+        for c in reversed(normalize(p)):
+            if c not in self.first:
+                return 0, 0
+            lo = self.first[c] + self._occ(c, lo)
+            hi = self.first[c] + self._occ(c, hi)
+            if lo >= hi:
+                return 0, 0
+        return lo, hi
+
+    def count(self, p):
+        """ Return the number of occurrences of p
+        Example:
+        >>> FMIndex("ACGTACGTTACG").count("ACG")
+        3
+        """
+        if self.k:
+            p = p[:self.k]
+        lo, hi = self._range(p)
+        return hi - lo
+
+    def _resolve(self, row):
+        """ Return the text offset of the suffix at row """
+        steps = 0
+        while True:
+            j = bisect.bisect_left(self.sa_rows, row)
+            if j < len(self.sa_rows) and self.sa_rows[j] == row:
+                return self.sa_vals[j] + steps
+            row = self._lf(row)
+            steps += 1
+
+    def query(self, p):
+        """ Return sorted offsets where p (or its first k chars) occurs
+        Example:
+        >>> FMIndex("ACGTACGTTACG", occ_rate=4, sa_rate=4).query("ACG")
+        [0, 4, 9]
+        """
+        if self.k:
+            p = p[:self.k]
+        lo, hi = self._range(p)
+        return sorted(self._resolve(row) for row in range(lo, hi))
+
+    @property
+    def nbytes(self):
+        """ Approximate memory held by the index arrays """
+        return (self.bwt.data.itemsize * len(self.bwt.data) +
+                sum(a.itemsize * len(a) for a in self.occ.values()) +
+                self.sa_rows.itemsize * len(self.sa_rows) * 2)
+
+
+def fm_index_matching(p, fm):
+    """ Return offsets of p in the text indexed by fm, like naive(p, t)
+    Example:
+    >>> fm_index_matching("ATGC", FMIndex("AATGCTTTATGC"))
+    [1, 8]
+    """
+    return fm.query(p)
+
+
+if __name__ == "__main__":
+    import doctest
+    if doctest.testmod().failed == 0:
+        print("Tests passed.")
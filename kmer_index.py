@@ -5,7 +5,15 @@
 __author__ = "Ben Langmead"
 
 import bisect
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+from itertools import accumulate
 from bm_preproc import BoyerMoore
+from fasta import readGenome
+from packed_seq import PackedSequence, encode, iter_kmer_codes, kmer_code
 
 
 class Index(object):
@@ -20,7 +28,13 @@ class Index(object):
         self.index.sort()  # alphabetize by k-mer
 
     def query(self, p):
-        """ Return index hits for first k-mer of p """
+        """ Return index hits for first k-mer of p.  t may be a str or a
+            2-bit PackedSequence.
+        Example:
+        >>> from packed_seq import PackedSequence
+        >>> Index(PackedSequence("ACGTACGTTACG"), 3).query("ACGTT")
+        [0, 4, 9]
+        """
         kmer = p[:self.k]  # query with first k-mer
         i = bisect.bisect_left(self.index, (kmer, -1))  # binary search
         hits = []
@@ -33,18 +47,162 @@ class Index(object):
         #  hits gives positions where first k char of p match in t.
 
 
-def readGenome(filename):
-    genome = ''
-    with open(filename, 'r') as f:
-        for line in f:
-            # ignore header line with genome information
-            if not line[0] == '>':
-                genome += line.rstrip()
-    return genome
+class FlatIndex(object):
+    """ Holds a k-mer index for a text T as 2-bit k-mer codes in flat
+        arrays.  positions lists every offset grouped by k-mer code (CSR
+        layout) and offsets[c]:offsets[c+1] is the slice holding code c, so
+        a query costs O(1) plus the number of hits.  K-mers overlapping an N
+        are not indexed.  Drop-in replacement for Index.  An index can be
+        saved to disk and memory-mapped back with load(). """
 
+    MAX_K = 13  # offsets has 4**k + 1 entries
+    MAGIC = b'KMERIDX\0'
+    VERSION = 1
+    # magic, version, byte-order mark, k, itemsize, len(offsets),
+    # len(positions), sha1 of the genome; array data follows the header
+    HEADER = struct.Struct('<8sIIIIQQ20s4x')
+    # The arrays are written in native byte order; this mark reads back as
+    # 0x01020304 only on a machine of the same byte order
+    BOM = struct.unpack('<I', struct.pack('=I', 0x01020304))[0]
 
-t = readGenome("chr1.GRCh38.excerpt.fasta")
-index = Index(t, 8)
+    def __init__(self, t, k):
+        """ Create index from all k-mers of t (a str or PackedSequence) """
+        if not 0 < k <= self.MAX_K:
+            raise ValueError('k must be between 1 and %d' % self.MAX_K)
+        self.k = k
+        self.checksum = genome_checksum(t)
+        codes = t.codes() if isinstance(t, PackedSequence) else encode(t)
+        typecode = 'I' if len(codes) < 2 ** 32 else 'Q'
+        # Counting sort: histogram of codes, prefix sums, then scatter
+        counts = array(typecode, bytes(array(typecode).itemsize * 4 ** k))
+        for _, code in iter_kmer_codes(codes, k):
+            counts[code] += 1
+        self.offsets = array(typecode, accumulate(counts, initial=0))
+        del counts
+        total = self.offsets[-1]
+        self.positions = array(typecode, bytes(array(typecode).itemsize * total))
+        cursor = array(typecode, self.offsets)
+        for i, code in iter_kmer_codes(codes, k):
+            self.positions[cursor[code]] = i
+            cursor[code] += 1
+
+    def query(self, p):
+        """ Return index hits for first k-mer of p
+        Example:
+        >>> FlatIndex("ACGTACGTTACG", 3).query("ACGTT")
+        [0, 4, 9]
+        >>> FlatIndex("ACGTACGTTACG", 3).query("ACNTT")
+        []
+        """
+        code = kmer_code(p[:self.k]) if len(p) >= self.k else None
+        if code is None:
+            return []
+        return self.positions[self.offsets[code]:self.offsets[code + 1]].tolist()
+
+    def save(self, filename):
+        """ Write the index to a versioned binary file.  It is written to a
+            temporary file first and renamed into place, so an interrupted
+            save never leaves a partial index under filename. """
+        tmp = '%s.tmp%d' % (filename, os.getpid())
+        try:
+            with open(tmp, 'wb') as fh:
+                fh.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.BOM,
+                                          self.k, self.offsets.itemsize,
+                                          len(self.offsets),
+                                          len(self.positions), self.checksum))
+                fh.write(memoryview(self.offsets).cast('B'))
+                fh.write(memoryview(self.positions).cast('B'))
+            os.replace(tmp, filename)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    @classmethod
+    def load(cls, filename, checksum=None):
+        """ Memory-map an index written by save().  The arrays are views of
+            the mapping, so loading costs no parsing and processes forked
+            afterwards share the same pages.  If checksum (see
+            genome_checksum) is given and differs from the one recorded at
+            build time the index is stale and ValueError is raised, as it is
+            for a file whose size does not match its header (truncated).
+        Example:
+        >>> import tempfile
+        >>> fname = os.path.join(tempfile.mkdtemp(), 'idx')
+        >>> FlatIndex("ACGTACGTTACG", 3).save(fname)
+        >>> FlatIndex.load(fname, genome_checksum("ACGTACGTTACG")).query("ACG")
+        [0, 4, 9]
+        >>> FlatIndex.load(fname, genome_checksum("ACGTACGTTACC"))
+        Traceback (most recent call last):
+        ...
+        ValueError: k-mer index was built from a different genome
+        >>> with open(fname, 'r+b') as fh:
+        ...     _ = fh.truncate(os.path.getsize(fname) - 4)
+        >>> FlatIndex.load(fname)  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+        ...
+        ValueError: ... is truncated or corrupt
+        """
+        with open(filename, 'rb') as fh:
+            if os.fstat(fh.fileno()).st_size < cls.HEADER.size:
+                raise ValueError('%s is truncated or corrupt' % filename)
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, bom, k, itemsize, noffsets, npositions,
+         stored) = cls.HEADER.unpack_from(mm)
+        if magic != cls.MAGIC:
+            raise ValueError('%s is not a k-mer index file' % filename)
+        if version != cls.VERSION or bom != cls.BOM:
+            raise ValueError('%s: unsupported index version or byte order'
+                             % filename)
+        typecode = {array('I').itemsize: 'I', 8: 'Q'}.get(itemsize)
+        if typecode is None or len(mm) != cls.HEADER.size + \
+                (noffsets + npositions) * itemsize:
+            raise ValueError('%s is truncated or corrupt' % filename)
+        if checksum is not None and checksum != stored:
+            raise ValueError('k-mer index was built from a different genome')
+        self = cls.__new__(cls)
+        self.k, self.checksum = k, stored
+        start = cls.HEADER.size
+        view = memoryview(mm)
+        self.offsets = view[start:start + noffsets * itemsize].cast(typecode)
+        start += noffsets * itemsize
+        self.positions = view[start:start + npositions * itemsize].cast(typecode)
+        return self
+
+
+def genome_checksum(t, chunk=1 << 20):
+    """ Return the SHA-1 digest identifying the genome an index was built
+        from.  A PackedSequence is hashed chunk bases at a time, so it is
+        never unpacked whole, and gets the same digest as its str.
+    Example:
+    >>> t = "ACGTNNACGT" * 5
+    >>> genome_checksum(PackedSequence(t), chunk=7) == genome_checksum(t)
+    True
+    """
+    if isinstance(t, PackedSequence):
+        digest = hashlib.sha1()
+        for i in range(0, len(t), chunk):
+            digest.update(t[i:i + chunk].encode('ascii'))
+        return digest.digest()
+    if isinstance(t, str):
+        t = t.encode('ascii')
+    return hashlib.sha1(t).digest()
+
+
+def cached_flat_index(t, k, filename):
+    """ Return a FlatIndex over t, memory-mapped from filename when that
+        file holds an index of t with the same k, otherwise built and saved
+        there for next time. """
+    checksum = genome_checksum(t)
+    if os.path.exists(filename):
+        try:
+            index = FlatIndex.load(filename, checksum)
+            if index.k == k:
+                return index
+        except ValueError:
+            pass  # stale or foreign file; rebuild it
+    index = FlatIndex(t, k)
+    index.save(filename)
+    return index
 
 
 def queryIndex(p, t, index):
@@ -96,6 +254,31 @@ def pigeon_hole_index_matching(p, t, index, n):
     return(len(matches), total_hits)
 
 
+def pigeon_hole_candidates(p, t, index, n):
+    """
+    Returns the sorted offsets where p may occur in t with at most n
+    differences: the offsets implied by exact index hits of each of the
+    n + 1 pigeonhole segments of p. Verification is left to the caller,
+    e.g. all at once with vectorized_dp.verify_candidates.
+    Example:
+    >>> t = "TTACGTAGCATTTACGTTGCAT"
+    >>> pigeon_hole_candidates("ACGTTGCA", t, FlatIndex(t, 3), 1)
+    [2, 13]
+    >>> from vectorized_dp import verify_candidates
+    >>> verify_candidates("ACGTTGCA", t, [2, 13], 1)
+    [(2, 1), (13, 0)]
+    """
+    segment_length = int(len(p) / (n + 1))
+    candidates = set()
+    for i in range(n + 1):
+        start = i * segment_length
+        end = min((i + 1) * segment_length, len(p))
+        _, occurrences = queryIndex(p[start:end], t, index)
+        for o in occurrences:
+            candidates.add(o - start)
+    return sorted(candidates)
+
+
 def naive_2mm(p, t):
     occurences = []
     for i in range(len(t) - len(p) + 1):
@@ -112,6 +295,13 @@ def naive_2mm(p, t):
     return len(occurences)
 
 
-p = 'GGCGCGGTGGCTCACGCCTGTAAT'
-print(pigeon_hole_index_matching(p, t, index, n=2))
-print(naive_2mm(p, t))
+if __name__ == "__main__":
+    t = readGenome("chr1.GRCh38.excerpt.fasta")
+    index = cached_flat_index(t, 8, "chr1.GRCh38.excerpt.fasta.k8.idx")
+    p = 'GGCGCGGTGGCTCACGCCTGTAAT'
+    print(pigeon_hole_index_matching(p, t, index, n=2))
+    print(naive_2mm(p, t))
+
+    import doctest
+    if doctest.testmod().failed == 0:
+        print("Tests passed.")
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+"""minimizers.py: (w, k)-minimizer sketches and error-tolerant overlaps."""
+
+from array import array
+from collections import deque
+
+import numpy as np
+
+from packed_seq import encode, iter_kmer_codes
+
+
+def kmer_hash(code, k):
+    """ Invertible scramble of a 2k-bit k-mer code, so minimizers are not
+        biased towards low-complexity k-mers such as poly-A """
+    mask = (1 << (2 * k)) - 1
+    code = (~code + (code << 21)) & mask
+    code ^= code >> 24
+    code = (code + (code << 3) + (code << 8)) & mask
+    code ^= code >> 14
+    code = (code + (code << 2) + (code << 4)) & mask
+    code ^= code >> 28
+    return (code + (code << 31)) & mask
+
+
+def minimizers(seq, w, k):
+    """ Return sorted (offset, hash) of the (w, k)-minimizers of seq: for
+        every window of w consecutive k-mers, the k-mer with the smallest
+        hash (the leftmost on ties).  A monotone deque keeps this O(len(seq))
+        however large w is; k-mers overlapping an N are skipped.
+    Example:
+    >>> [o for o, _ in minimizers("ACGTTGCATGCCATAGGACT", 4, 5)]
+    [0, 3, 5, 7, 10, 13, 15]
+    """
+    found = []
+    window = deque()  # (offset, hash), hashes increasing
+    for i, (offset, code) in enumerate(iter_kmer_codes(encode(seq), k)):
+        h = kmer_hash(code, k)
+        while window and window[-1][1] > h:
+            window.pop()
+        window.append((offset, h))
+        while window[0][0] <= offset - w:
+            window.popleft()
+        if i >= w - 1 and (not found or found[-1] != window[0]):
+            found.append(window[0])
+    if found:
+        return found
+    # sequence shorter than one window: its single smallest k-mer
+    return sorted(window, key=lambda x: x[1])[:1]
+
+
+def occurrence_cutoff(sizes, top_fraction=2e-4):
+    """ Return the bucket size above which the top_fraction most frequent
+        of the given minimizer bucket sizes lie (as minimap2's -f)
+    Example:
+    >>> occurrence_cutoff([3] * 9998 + [500, 9000])
+    3
+    """
+    sizes = sorted(sizes)
+    if not sizes:
+        return 0
+    return sizes[len(sizes) - 1 - int(len(sizes) * top_fraction)]
+
+
+class MinimizerIndex(object):
+    """ Maps minimizer hash -> [(read id, offset)] for a set of reads.
+        Every pair of reads sharing a minimizer is a possible candidate, so
+        the work grows with the square of its bucket size: minimizers
+        occurring more than max_occ times (repeats) are dropped.  By
+        default max_occ is taken from the bucket size distribution with
+        occurrence_cutoff; pass max_occ=0 to keep every minimizer. """
+
+    def __init__(self, reads, w=10, k=15, max_occ=None, top_fraction=2e-4):
+        self.w, self.k = w, k
+        self.buckets = {}
+        self.sketches = []  # per read, its (offset, hash) minimizers
+        for rid, seq in enumerate(reads):
+            sketch = minimizers(seq, w, k)
+            self.sketches.append(sketch)
+            for offset, h in sketch:
+                self.buckets.setdefault(h, []).append((rid, offset))
+        if max_occ is None:
+            max_occ = occurrence_cutoff(map(len, self.buckets.values()),
+                                        top_fraction)
+        self.max_occ = max_occ
+        if max_occ:
+            for h in [h for h, b in self.buckets.items() if len(b) > max_occ]:
+                del self.buckets[h]
+
+    def candidate_pairs(self, min_shared=2, band=8, block=256):
+        """ Return {(a, b): offset} for pairs of reads sharing at least
+            min_shared minimizers whose diagonals (b starting offset bases
+            into a) lie within band of each other; offset is the median
+            diagonal of the best supported group, and b starts strictly
+            after a.  Reads a are taken block at a time: each block's
+            (a, b, diagonal) hits are packed into one int64 per hit and
+            sorted, so grouping and the sliding band are numpy operations
+            and memory stays proportional to the block.
+        Example:
+        >>> idx = MinimizerIndex(["ACGTTGCATGCCATAGGACT", "CATGCCATAGGACTTT"],
+        ...                      w=2, k=5)
+        >>> idx.candidate_pairs()
+        {(0, 1): 6}
+        """
+        nreads = len(self.sketches)
+        arrays = {h: (np.array([r for r, _ in b], dtype=np.int64),
+                      np.array([o for _, o in b], dtype=np.int64))
+                  for h, b in self.buckets.items()}
+        longest = max((sk[-1][0] for sk in self.sketches if sk), default=0)
+        shift = (longest + band + 1).bit_length()  # bits holding a diagonal
+        pairs = {}
+        for lo in range(0, nreads, block):
+            hits = []
+            for a in range(lo, min(lo + block, nreads)):
+                for pa, h in self.sketches[a]:
+                    found = arrays.get(h)
+                    if found is None:
+                        continue
+                    ids, offsets = found
+                    keep = (offsets < pa) & (ids != a)
+                    hits.append((((a * nreads + ids[keep]) << shift) |
+                                 (pa - offsets[keep])))
+            hits = np.sort(np.concatenate(hits)) if hits else []
+            if not len(hits):
+                continue
+            # hits within band of each one share its pair (d + band does
+            # not carry out of the diagonal bits)
+            support = np.searchsorted(hits, hits + band, 'right')
+            support -= np.arange(len(hits))
+            pair = hits >> shift
+            starts = np.flatnonzero(np.r_[True, pair[1:] != pair[:-1]])
+            best = np.maximum.reduceat(support, starts)
+            group = np.repeat(np.arange(len(starts)),
+                              np.diff(np.r_[starts, len(hits)]))
+            first = np.flatnonzero(support == best[group])
+            first = first[np.r_[True, group[first][1:] != group[first][:-1]]]
+            ok = best >= min_shared
+            first = first[ok]
+            median = hits[first + (support[first] - 1) // 2]
+            median &= (1 << shift) - 1
+            a, b = np.divmod(pair[first], nreads)
+            pairs.update(zip(zip(a.tolist(), b.tolist()), median.tolist()))
+        return pairs
+
+
+def approx_overlap(a, b, estimate, max_errors=2, min_length=1, slack=None):
+    """ Return (length, mismatches) of the suffix-prefix overlap of a and b
+        with the fewest mismatches (at most max_errors; the longest on
+        ties) among lengths within slack of estimate, or None.  Lengths are
+        tried longest first, an exact match ends the search, and counting
+        stops as soon as max_errors is exceeded.  Only substitutions are
+        allowed, the usual Illumina error; an indel shifts the diagonal and
+        is better handled by a full alignment.
+    Example:
+    >>> approx_overlap("TTTTACGTACGGAT", "ACGTACCGATCCCC", 10)
+    (10, 1)
+    >>> approx_overlap("TTTTACGTACGGAT", "ACGTACCGATCCCC", 10, max_errors=0)
+    """
+    if slack is None:
+        slack = max_errors
+    top = min(len(a), len(b), estimate + slack)
+    lengths = range(top, max(min_length, estimate - slack) - 1, -1)
+    for length in lengths:
+        if a[-length:] == b[:length]:
+            return length, 0  # exact and longest
+    best = None
+    for length in lengths:
+        mismatches = 0
+        for x, y in zip(a[-length:], b[:length]):
+            if x != y:
+                mismatches += 1
+                if mismatches > max_errors:
+                    break
+        if mismatches <= max_errors and (best is None or
+                                         mismatches < best[1]):
+            best = (length, mismatches)
+    return best
+
+
+def minimizer_overlaps(reads, min_overlap, w=10, k=15, max_errors=2,
+                       min_shared=2, max_occ=None, band=8):
+    """ Return CSR overlap arrays (offsets, targets, lengths), as
+        overlap_graphs.overlap_index, of overlaps at least min_overlap long
+        with up to max_errors mismatches.  Candidates come from shared
+        minimizers (see MinimizerIndex.candidate_pairs for min_shared and
+        band, and MinimizerIndex for max_occ), so an error inside a read's
+        first k bases no longer hides its overlaps.
+    Example:
+    >>> t = "GATTACAGGCATTAGCCATTAGGACCATGACATGGTTACCAGGATTTAACCCGAGTAAGC"
+    >>> r0, r1 = t[0:40], t[20:60]
+    >>> r1 = r1[:2] + "T" + r1[3:]   # error in r1's prefix
+    >>> offsets, targets, lengths = minimizer_overlaps([r0, r1], 15,
+    ...                                                w=4, k=8)
+    >>> list(offsets), list(targets), list(lengths)
+    ([0, 1, 1], [1], [20])
+    """
+    index = MinimizerIndex(reads, w, k, max_occ)
+    rows = [[] for _ in reads]
+    for (a, b), d in index.candidate_pairs(min_shared, band).items():
+        found = approx_overlap(reads[a], reads[b], len(reads[a]) - d,
+                               max_errors, min_overlap)
+        if found is not None:
+            rows[a].append((b, found[0]))
+    offsets = array('Q', [0])
+    targets = array('i')
+    lengths = array('i')
+    for row in rows:
+        row.sort()
+        for b, olen in row:
+            targets.append(b)
+            lengths.append(olen)
+        offsets.append(len(targets))
+    return offsets, targets, lengths
+
+
+if __name__ == "__main__":
+    import doctest
+    if doctest.testmod().failed == 0:
+        print("Tests passed.")
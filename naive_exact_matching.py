@@ -1,56 +1,49 @@
+from fasta import readGenome
+from fastq_qc import qc_fastq
+from packed_seq import COMPLEMENT
+
+
 def reverse_complement(strand):
     """returns complementary dna strand (string)
     Example:
     >>> reverse_complement("ATGC")
     'GCAT'
     """
-
-    complement = {
-        "A": "T",
-        "T": "A",
-        "G": "C",
-        "C": "G",
-        "N": "N"
-    }
-    complementary_strand = ""
-    for base in strand:
-        complementary_strand = complement[base] + complementary_strand
-    return complementary_strand
-
-
-def readFastq(filename):
-    sequences = []
-    qualities = []
-    with open(filename) as fh:
-        while True:
-            fh.readline()  # skip name line
-            seq = fh.readline().rstrip()  # read base sequence
-            fh.readline()  # skip placeholder line
-            qual = fh.readline().rstrip()  # base quality line
-            if len(seq) == 0:
-                break
-            sequences.append(seq)
-            qualities.append(qual)
-    return sequences, qualities
+    return strand.translate(COMPLEMENT)[::-1]
 
 
-def readGenome(filename):
-    genome = ''
-    with open(filename, 'r') as f:
-        for line in f:
-            # ignore header line with genome information
-            if not line[0] == '>':
-                genome += line.rstrip()
-    return genome
+def mismatch_backend(name):
+    """ Returns the scanning function registered under name.  Each takes
+    (p, t, n) and returns the offsets where p matches t with at most n
+    mismatches; backends are imported on first use.
+    """
+    if name == "numpy":
+        from vectorized_matching import naive_numpy
+        return naive_numpy
+    if name == "shift_and":
+        from bitparallel import shift_and_matching
+        return shift_and_matching
+    raise ValueError("unknown matching backend %r" % name)
 
 
-def naive(p, t):
+def naive(p, t, backend="python"):
     """ Returns a list of indeces of chars in p matching in t.
     Example:
     >>> naive("ATGC", "AATGCTTTATGC")
     [1, 8]
 
+    t may also be a 2-bit PackedSequence:
+    >>> from packed_seq import PackedSequence
+    >>> naive("ATGC", PackedSequence("AATGCTTTATGC"))
+    [1, 8]
+
+    or scanned with a vectorized backend:
+    >>> naive("ATGC", "AATGCTTTATGC", backend="numpy")
+    [1, 8]
+
     """
+    if backend != "python":
+        return mismatch_backend(backend)(p, t, 0)
     occurences = []
     for i in range(len(t) - len(p) + 1):
         match = True
@@ -63,6 +56,50 @@ def naive(p, t):
     return occurences
 
 
+def naive_stranded(p, t, index=None):
+    """ Returns (offset, strand) for every occurrence of p ('+') or of its
+    reverse complement ('-') in t, sorted by offset.  Both strands are
+    checked in a single pass over t; a palindromic p is only reported on
+    '+'.  If an index of t is given (Index, FlatIndex, SuffixArrayIndex,
+    FMIndex, ...), it is queried for both strands instead of scanning.
+    A p shorter than the index's k, or with a character other than A/C/G/T
+    (FlatIndex leaves out k-mers containing N), cannot always be looked up
+    and is scanned instead.
+    Example:
+    >>> naive_stranded("ATGC", "AATGCTACGTTATGC")
+    [(1, '+'), (11, '+')]
+    >>> naive_stranded("ACCT", "AACCTTAGGTA")
+    [(1, '+'), (6, '-')]
+    >>> from kmer_index import FlatIndex
+    >>> t = "AACCTTAGGTA"
+    >>> naive_stranded("ACCT", t, FlatIndex(t, 2))
+    [(1, '+'), (6, '-')]
+    >>> naive_stranded("ACC", t, FlatIndex(t, 4))
+    [(1, '+'), (7, '-')]
+    >>> t = "AACNTTAGGNA"
+    >>> naive_stranded("CNT", t, FlatIndex(t, 2))
+    [(2, '+')]
+    """
+    rc = reverse_complement(p)
+    strands = [(p, '+')] if rc == p else [(p, '+'), (rc, '-')]
+    if index is not None and len(p) >= getattr(index, 'k', 0) and \
+            set(p) <= set('ACGT'):
+        hits = []
+        for q, strand in strands:
+            hits.extend((i, strand) for i in index.query(q)
+                        if t[i:i + len(q)] == q)
+        return sorted(hits)
+    m = len(p)
+    hits = []
+    for i in range(len(t) - m + 1):
+        window = t[i:i + m]
+        if window == p:
+            hits.append((i, '+'))
+        elif window == rc:
+            hits.append((i, '-'))
+    return hits
+
+
 def naive_with_rc(p, t):
     """ Returns a list of indeces of chars in p and complement_p matching in t
     Example:
@@ -70,39 +107,21 @@ def naive_with_rc(p, t):
     [1, 11]
 
     """
-    complement_p = reverse_complement(p)
-    occurences = []
-    if p != complement_p:
-        for i in range(len(t) - len(p) + 1):
-            match = True
-            for j in range(len(p)):
-                if t[i + j] != p[j]:
-                    match = False
-                    break
-            if match:
-                occurences.append(i)
-        for i in range(len(t) - len(p) + 1):
-            match = True
-            for j in range(len(p)):
-                if t[i + j] != complement_p[j]:
-                    match = False
-                    break
-            if match:
-                occurences.append(i)
-
-    else:
-        for i in range(len(t) - len(p) + 1):
-            match = True
-            for j in range(len(p)):
-                if t[i + j] != p[j]:
-                    match = False
-                    break
-            if match:
-                occurences.append(i)
-    return occurences
+    return [i for i, _ in naive_stranded(p, t)]
 
 
-def naive_2mm(p, t):
+def naive_2mm(p, t, n=2, backend="python"):
+    """ Returns offsets where p matches t with at most n mismatches.
+    Example:
+    >>> naive_2mm("ATGC", "AATGCTTTATGC", n=3)
+    [0, 1, 4, 5, 6, 8]
+    >>> naive_2mm("ATGC", "AATGCTTTATGC", n=3, backend="numpy")
+    [0, 1, 4, 5, 6, 8]
+    >>> naive_2mm("ATGC", "AATGCTTTATGC", n=3, backend="shift_and")
+    [0, 1, 4, 5, 6, 8]
+    """
+    if backend != "python":
+        return mismatch_backend(backend)(p, t, n)
     occurences = []
     for i in range(len(t) - len(p) + 1):
         match = True
@@ -110,7 +129,7 @@ def naive_2mm(p, t):
         for j in range(len(p)):
             if t[i + j] != p[j]:
                 error += 1
-                if error > 2:
+                if error > n:
                     match = False
                     break
         if match:
@@ -171,24 +190,17 @@ print("ans.5: ", leftmost_occur)
 
 # Report which sequencing cycle has the problem. Remember that a sequencing cycle corresponds to a particular offset in all the reads. For example, if the leftmost read position seems to have a problem consistently across reads, report 0. If the fourth position from the left has the problem, report 3. Do whatever analysis you think is needed to identify the bad cycle. It might help to review the "Analyzing reads by position" video.
 filename = "ERR037900_1.first1000.fastq"
-human_sequences, _ = readFastq(filename)
 
 
-def find_N_by_pos(sequences):
-    n = [0] * 100
-
-    for sequence in sequences:
-        for i in range(len(sequence)):
-            if sequence[i] == "N":
-                n[i] += 1
-
-    maximum_freq_N = max(n)
-    for i in range(100):
-        if n[i] == maximum_freq_N:
-            return i
+def find_N_by_pos(filename):
+    """ Returns the (0-based) cycle with the most N calls, counted in
+    one streaming pass with fastq_qc.CycleStats
+    """
+    n = qc_fastq(filename).n_counts()
+    return int(n.argmax())
 
 
-print("ans.6: ", find_N_by_pos(human_sequences))
+print("ans.6: ", find_N_by_pos(filename))
 
 if __name__ == "__main__":
     import doctest
@@ -1,20 +1,7 @@
-from itertools import permutations
-from time import perf_counter_ns
+from array import array
 
-
-def readFastq(filename):
-    sequences = []
-
-    with open(filename) as fh:
-        while True:
-            fh.readline()  # skip name line
-            seq = fh.readline().rstrip()  # read base sequence
-            fh.readline()  # skip placeholder line
-            qual = fh.readline().rstrip()  # base quality line
-            if len(seq) == 0:
-                break
-            sequences.append(seq)
-    return sequences
+from aho_corasick import AhoCorasick
+from fastq import iter_sequences
 
 
 def overlap(a, b, min_length=3):
@@ -26,7 +13,9 @@ def overlap(a, b, min_length=3):
         >>> a = "abbcd"
         >>> b = "cdefff"
         >>> print(overlap(a, b))
-
+        0
+        >>> print(overlap(a, b, 2))
+        2
         """
     start = 0  # start all the way at the left
     while True:
@@ -39,43 +28,286 @@ def overlap(a, b, min_length=3):
         start += 1  # move just past previous match
 
 
-def overlap_graph(reads, k):
+def overlap_index(reads, k):
+    """ Return every suffix-prefix overlap of length >= k between distinct
+        reads as CSR adjacency arrays (offsets, targets, lengths): the
+        overlaps of read i go to reads targets[offsets[i]:offsets[i+1]]
+        (sorted), with the longest overlap lengths in lengths[...].
+        The reads are put, in sorted order, into one Aho-Corasick trie, so
+        the reads starting with any trie string form a contiguous range of
+        sorted ranks.  The fail chain of read a's own state visits exactly
+        the suffixes of a that are prefixes of some read, longest first,
+        so the total work is linear in the reads' length plus the number
+        of overlaps reported.
+    Example:
+    >>> offsets, targets, lengths = overlap_index(["ACGTT", "GTTCA", "TTCAG"], 2)
+    >>> list(offsets), list(targets), list(lengths)
+    ([0, 2, 3, 3], [1, 2, 2], [3, 2, 4])
     """
+    order = sorted(range(len(reads)), key=reads.__getitem__)
+    ac = AhoCorasick([reads[i] for i in order], alphabet='ACGTN')
+    goto, fail, depth, sigma = ac.goto, ac.fail, ac.depth, ac.sigma
+    # Rank range [lo, hi) of the sorted reads passing through each state
+    lo = array('i', [0]) * len(depth)
+    hi = array('i', [0]) * len(depth)
+    for rank, read in enumerate(ac.patterns):
+        state = 0
+        for code in read.encode('ascii').translate(ac.table):
+            state = goto[state * sigma + code]
+            if hi[state] == 0:
+                lo[state] = rank
+            hi[state] = rank + 1
+    rows = [None] * len(reads)
+    for rank, a in enumerate(order):
+        row = []
+        taken = []  # rank ranges already given a longer overlap
+        s = ac.terminal[rank]
+        while depth[s] >= k:
+            start, end = lo[s], hi[s]
+            # Ranges of deeper states are either inside this one or disjoint
+            for t_lo, t_hi in sorted(r for r in taken if start <= r[0] < end):
+                row.extend((order[b], depth[s]) for b in range(start, t_lo)
+                           if b != rank)
+                start = max(start, t_hi)
+            row.extend((order[b], depth[s]) for b in range(start, end)
+                       if b != rank)
+            taken.append((lo[s], hi[s]))
+            s = fail[s]
+        row.sort()
+        rows[a] = row
+    offsets = array('Q', [0])
+    targets = array('i')
+    lengths = array('i')
+    for row in rows:
+        for b, olen in row:
+            targets.append(b)
+            lengths.append(olen)
+        offsets.append(len(targets))
+    return offsets, targets, lengths
+
+
+VACANT, INPLAY, ELIMINATED = 0, 1, 2
+
+
+class OverlapGraph(object):
+    """ Overlap graph over integer read ids 0..len(reads)-1, stored as CSR
+        arrays: the edges of read v are offsets[v]:offsets[v+1] in targets
+        (the overlapping read) and lengths (the overlap length), ordered by
+        overhang (how far the target reaches past the end of v) and then by
+        target.  reads is kept by reference, not copied. """
+
+    def __init__(self, reads, offsets, targets, lengths):
+        self.reads = reads
+        self.offsets = array('Q', [0])
+        self.targets = array('i')
+        self.lengths = array('i')
+        for v in range(len(reads)):
+            row = sorted((len(reads[targets[e]]) - lengths[e], targets[e],
+                          lengths[e])
+                         for e in range(offsets[v], offsets[v + 1]))
+            for _, w, olen in row:
+                self.targets.append(w)
+                self.lengths.append(olen)
+            self.offsets.append(len(self.targets))
+
+    def __len__(self):
+        return len(self.reads)
+
+    @property
+    def num_edges(self):
+        return len(self.targets)
+
+    def out_edges(self, v):
+        """ Return [(target, overlap length)] of read v """
+        lo, hi = self.offsets[v], self.offsets[v + 1]
+        return list(zip(self.targets[lo:hi], self.lengths[lo:hi]))
+
+    def edges(self):
+        """ Yield (source, target, overlap length) for every edge """
+        for v in range(len(self.reads)):
+            for w, olen in self.out_edges(v):
+                yield v, w, olen
+
+    def in_degrees(self):
+        indeg = array('i', [0]) * len(self.reads)
+        for w in self.targets:
+            indeg[w] += 1
+        return indeg
+
+    def transitive_reduction(self):
+        """ Remove every edge v -> x that is implied by a path v -> w -> x
+            placing x at the same offset, following Myers (2005): the
+            neighbours of v are marked in play, and the short edges out of
+            each neighbour w (rows are sorted by overhang, so the scan stops
+            at the longest overhang of v) eliminate the neighbours they
+            reach.  Expected time is linear in the number of edges when
+            out-degrees are bounded.  Returns the number of edges removed.
+        Example:
+        >>> t = "GATTACAGGCATTAGCCATTAGGACCATGACATGGTTACCAGGATTTAACCCGAGTAAGC"
+        >>> g = overlap_graph([t[i:i + 12] for i in range(0, 49, 3)], 5)
+        >>> g.num_edges, g.transitive_reduction(), g.num_edges
+        (31, 15, 16)
+        """
+        reads, offsets, targets, lengths = self.reads, self.offsets, \
+            self.targets, self.lengths
+        n = len(reads)
+        mark = bytearray(n)
+        overhang = array('i', [0]) * n  # overhang of v -> w, per w in play
+        keep = bytearray(b'\x01') * len(targets)
+        for v in range(n):
+            lo, hi = offsets[v], offsets[v + 1]
+            if lo == hi:
+                continue
+            for e in range(lo, hi):
+                w = targets[e]
+                mark[w] = INPLAY
+                overhang[w] = len(reads[w]) - lengths[e]
+            longest = overhang[targets[hi - 1]]
+            for e in range(lo, hi):
+                w = targets[e]
+                if mark[w] != INPLAY:
+                    continue
+                for f in range(offsets[w], offsets[w + 1]):
+                    x = targets[f]
+                    total = overhang[w] + len(reads[x]) - lengths[f]
+                    if total > longest:
+                        break
+                    if mark[x] == INPLAY and overhang[x] == total:
+                        mark[x] = ELIMINATED
+            for e in range(lo, hi):
+                w = targets[e]
+                if mark[w] == ELIMINATED:
+                    keep[e] = 0
+                mark[w] = VACANT
+        removed = len(keep) - sum(keep)
+        self.offsets = array('Q', [0])
+        self.targets = array('i')
+        self.lengths = array('i')
+        for v in range(n):
+            for e in range(offsets[v], offsets[v + 1]):
+                if keep[e]:
+                    self.targets.append(targets[e])
+                    self.lengths.append(lengths[e])
+            self.offsets.append(len(self.targets))
+        return removed
+
+    def unitigs(self):
+        """ Return chains of read ids joined by unambiguous edges (the
+            source's only out-edge and the target's only in-edge), starting
+            at reads that do not continue such a chain; cycles of them are
+            returned once, starting at their smallest read id.
+        Example:
+        >>> t = "GATTACAGGCATTAGCCATTAGGACCATGACATGGTTACCAGGATTTAACCCGAGTAAGC"
+        >>> g = overlap_graph([t[i:i + 12] for i in range(0, 49, 3)], 5)
+        >>> _ = g.transitive_reduction()
+        >>> g.unitigs()
+        [[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16]]
+        """
+        n = len(self.reads)
+        offsets, targets = self.offsets, self.targets
+        indeg = self.in_degrees()
+        pred = array('i', [-1]) * n
+        for v in range(n):
+            for e in range(offsets[v], offsets[v + 1]):
+                pred[targets[e]] = v
+
+        def next_in_chain(v):
+            if offsets[v + 1] - offsets[v] != 1:
+                return -1
+            w = targets[offsets[v]]
+            return w if indeg[w] == 1 else -1
+
+        visited = bytearray(n)
+        chains = []
+        for v in range(n):
+            continues = indeg[v] == 1 and next_in_chain(pred[v]) == v
+            for start in ([] if continues else [v]):
+                chain = [start]
+                visited[start] = 1
+                w = next_in_chain(start)
+                while w != -1 and not visited[w]:
+                    chain.append(w)
+                    visited[w] = 1
+                    w = next_in_chain(w)
+                chains.append(chain)
+        for v in range(n):  # cycles of unambiguous edges
+            if not visited[v]:
+                chain = [v]
+                visited[v] = 1
+                w = next_in_chain(v)
+                while not visited[w]:
+                    chain.append(w)
+                    visited[w] = 1
+                    w = next_in_chain(w)
+                chains.append(chain)
+        return chains
+
+    def _pieces(self, chain):
+        """ Yield the parts of the reads of chain that make up its contig """
+        reads, offsets, lengths = self.reads, self.offsets, self.lengths
+        yield reads[chain[0]]
+        for v, w in zip(chain, chain[1:]):
+            yield reads[w][lengths[offsets[v]]:]
+
+    def contig(self, chain):
+        return ''.join(self._pieces(chain))
+
+    def write_contigs(self, out, min_length=0, prefix='contig'):
+        """ Write the contig of every unitig at least min_length long to out
+            as FASTA, one read piece at a time, so contigs are never built
+            as strings; returns the number written """
+        written = 0
+        for chain in self.unitigs():
+            length = sum(len(p) for p in self._pieces(chain))
+            if length < min_length:
+                continue
+            written += 1
+            out.write('>%s_%d reads=%d length=%d\n'
+                      % (prefix, written, len(chain), length))
+            for piece in self._pieces(chain):
+                out.write(piece)
+            out.write('\n')
+        return written
+
+
+def overlap_graph(reads, k, method='exact', **options):
+    """ Return the OverlapGraph of all suffix-prefix overlaps of length >= k
+        between reads.  method 'exact' uses overlap_index; 'minimizer' uses
+        minimizers.minimizer_overlaps, which also finds overlaps with a few
+        sequencing errors (options such as max_errors, w and min_shared are
+        passed on to it).
     >>> reads = ['CGTACG', 'TACGTA', 'GTACGT', 'ACGTAC', 'GTACGA', 'TACGAT']
-    >>> overlap_graph(reads, 3)
+    >>> g = overlap_graph(reads, 4)
+    >>> for a, b, olen in g.edges():
+    ...     print(reads[a], reads[b], olen)
+    CGTACG GTACGT 5
+    CGTACG GTACGA 5
+    CGTACG TACGTA 4
+    CGTACG TACGAT 4
+    TACGTA ACGTAC 5
+    TACGTA CGTACG 4
+    GTACGT TACGTA 5
+    GTACGT ACGTAC 4
+    ACGTAC CGTACG 5
+    ACGTAC GTACGT 4
+    ACGTAC GTACGA 4
+    GTACGA TACGAT 5
+    >>> reads = ['CCGTAATGCCTTTCCCTAACAGAGTTTTTCGAACTCGTGT',
+    ...          'TTTACCTAACAGAGTTTTTCGAACTCGTGTTGTCGAGCGA']
+    >>> list(overlap_graph(reads, 15).edges())
+    []
+    >>> list(overlap_graph(reads, 15, method='minimizer', w=4).edges())
+    [(0, 1, 30)]
     """
-    start = perf_counter_ns()
-    k_reads = {}
-    overlapgraph = {}
-    len_reads = len(reads)
-    # Preprocessing:
-    for i in range(len_reads):
-        kmer = reads[i][:k]
-        if kmer not in k_reads:
-            k_reads[kmer] = set()
-        k_reads[kmer].add(reads[i])
-    # print(k_reads)
-    for a in reads:
-        a_suffix = a[-k:]
-        if a_suffix in k_reads:
-            for b in k_reads[a_suffix]:
-                olen = overlap(a, b, k)
-                overlapgraph[(a, b)] = olen
-    # print(overlapgraph)
-    # count = 0
-    # seen = set()
-    # for entry in overlapgraph:
-    #     if entry[0] not in seen:
-    #         seen.add(entry[0])
-    #     else:
-    #         count += 1
-    # print("count is: ", count)
-    # print(len(overlapgraph))
-    end = perf_counter_ns() - start
-    print(f"Time overlap_graph takes: {end/100} s")
-
-
-# reads = readFastq("ERR266411_1.for_asm.fastq")
+    if method == 'exact':
+        return OverlapGraph(reads, *overlap_index(reads, k))
+    if method == 'minimizer':
+        from minimizers import minimizer_overlaps
+        return OverlapGraph(reads, *minimizer_overlaps(reads, k, **options))
+    raise ValueError('unknown overlap method %r' % method)
+
+
+# reads = list(iter_sequences("ERR266411_1.for_asm.fastq"))
 # print(len(reads))
 # overlap_graph(reads, 30)
 
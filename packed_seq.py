@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+"""packed_seq.py: 2-bit packed nucleotide sequences."""
+
+import bisect
+import re
+from array import array
+
+ALPHABET = 'ACGT'
+N_CODE = 4  # code given to any base outside ALPHABET
+
+# bytes.translate table: ASCII base -> 2-bit code (N_CODE for non-ACGT)
+ENCODE_TABLE = bytes(ALPHABET.find(chr(c).upper()) % (N_CODE + 1)
+                     if c < 128 else N_CODE for c in range(256))
+COMPLEMENT = str.maketrans('ACGTN', 'TGCAN')
+
+# One packed byte holds 4 bases, first base in the two most significant bits
+_UNPACK = [''.join(ALPHABET[(b >> s) & 3] for s in (6, 4, 2, 0))
+           for b in range(256)]
+_NOT_ACGT = re.compile(r'[^ACGT]+')
+# bytes.translate tables picking base j (0-3) of a packed byte as its code
+_LANES = [bytes((b >> s) & 3 for b in range(256)) for s in (6, 4, 2, 0)]
+
+
+def encode(seq):
+    """ Return bytes holding the 2-bit code of every base of seq (a str or
+        bytes-like object); bases other than A/C/G/T get N_CODE.
+    Example:
+    >>> list(encode("ACGTN"))
+    [0, 1, 2, 3, 4]
+    """
+    if isinstance(seq, str):
+        seq = seq.encode('ascii')
+    return bytes(seq).translate(ENCODE_TABLE)
+
+
+def normalize(seq):
+    """ Return seq as a PackedSequence reads it back: upper case, with every
+        character other than A/C/G/T turned into N
+    Example:
+    >>> normalize("acgtRYNa")
+    'ACGTNNNA'
+    """
+    return _NOT_ACGT.sub(lambda m: 'N' * len(m.group()), seq.upper())
+
+
+def decode_kmer(code, k):
+    """ Return the k-mer string for an integer code.
+    Example:
+    >>> decode_kmer(27, 3)
+    'CGT'
+    """
+    return ''.join(ALPHABET[(code >> (2 * (k - 1 - i))) & 3] for i in range(k))
+
+
+def kmer_code(kmer):
+    """ Return the integer code of a k-mer string (first base in the most
+        significant bits), or None if it contains a non-ACGT base.
+    Example:
+    >>> kmer_code("CGT"), kmer_code("CNT")
+    (27, None)
+    """
+    code = 0
+    for c in encode(kmer):
+        if c == N_CODE:
+            return None
+        code = (code << 2) | c
+    return code
+
+
+def iter_kmer_codes(codes, k):
+    """ Yield (offset, code) for every k-mer of a sequence given as 2-bit
+        codes (see encode), skipping k-mers that overlap an N.  Codes are
+        rolled forward one base at a time.
+    Example:
+    >>> list(iter_kmer_codes(encode("ACGNTTG"), 2))
+    [(0, 1), (1, 6), (4, 15), (5, 14)]
+    """
+    mask = (1 << (2 * k)) - 1
+    code = 0
+    valid = 0  # number of ACGT bases ending at the current offset
+    for i, c in enumerate(codes):
+        if c == N_CODE:
+            valid = 0
+            continue
+        code = ((code << 2) | c) & mask
+        valid += 1
+        if valid >= k:
+            yield i - k + 1, code
+
+
+def reverse_complement(seq):
+    """ Return the reverse complement of a DNA string.
+    Example:
+    >>> reverse_complement("ATGCN")
+    'NGCAT'
+    """
+    return seq.translate(COMPLEMENT)[::-1]
+
+
+class PackedSequence(object):
+    """ A DNA sequence stored at 2 bits per base in an array of bytes.
+        Runs of non-ACGT characters are recorded in a side mask and read back
+        as 'N'.  Indexing returns one-character strings and slicing returns
+        str, so code written against plain str texts (naive, boyer_moore,
+        Index, SubseqIndex) works on a PackedSequence unchanged.
+    Example:
+    >>> s = PackedSequence("ACGTNNACGTTG")
+    >>> len(s), s[4], s[2:8], str(s)
+    (12, 'N', 'GTNNAC', 'ACGTNNACGTTG')
+    >>> s.kmer(0, 3), s.kmer(3, 3)
+    (6, None)
+    >>> str(s.reverse_complement())
+    'CAACGTNNACGT'
+    """
+
+    def __init__(self, seq):
+        if isinstance(seq, str):
+            seq = seq.encode('ascii')
+        seq = bytes(seq).upper()
+        self.length = len(seq)
+        # Side mask of [start, end) runs of non-ACGT characters
+        self.n_starts = array('l')
+        self.n_ends = array('l')
+        for m in _NOT_ACGT.finditer(seq.decode('ascii')):
+            self.n_starts.append(m.start())
+            self.n_ends.append(m.end())
+        codes = seq.translate(ENCODE_TABLE).replace(b'\x04', b'\x00')
+        codes += b'\x00' * (-len(codes) % 4)
+        # OR the four interleaved code streams together as big integers so
+        # packing runs at C speed rather than one Python step per base
+        nbytes = len(codes) // 4
+        packed = 0
+        for j, shift in enumerate((6, 4, 2, 0)):
+            lane = codes[j::4]
+            packed |= int.from_bytes(lane, 'big') << shift
+        self.data = array('B', packed.to_bytes(nbytes, 'big'))
+
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        return 'PackedSequence(%d bp)' % self.length
+
+    def __str__(self):
+        return self._decode(0, self.length)
+
+    def _in_n_run(self, i):
+        j = bisect.bisect_right(self.n_starts, i) - 1
+        return j >= 0 and i < self.n_ends[j]
+
+    def _decode(self, start, stop):
+        """ Return bases [start, stop) as a str """
+        if start >= stop:
+            return ''
+        lo, hi = start >> 2, ((stop - 1) >> 2) + 1
+        s = ''.join([_UNPACK[b] for b in self.data[lo:hi]])
+        s = s[start - 4 * lo:stop - 4 * lo]
+        if self.n_starts:
+            j = max(bisect.bisect_right(self.n_starts, start) - 1, 0)
+            pieces = []
+            done = start
+            while j < len(self.n_starts) and self.n_starts[j] < stop:
+                ns, ne = max(self.n_starts[j], start), min(self.n_ends[j], stop)
+                if ns < ne:
+                    pieces.append(s[done - start:ns - start])
+                    pieces.append('N' * (ne - ns))
+                    done = ne
+                j += 1
+            pieces.append(s[done - start:])
+            s = ''.join(pieces)
+        return s
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            if step == 1:
+                return self._decode(start, stop)
+            if step > 0:
+                return self._decode(start, stop)[::step]
+            return str(self)[key]
+        if key < 0:
+            key += self.length
+        if not 0 <= key < self.length:
+            raise IndexError('PackedSequence index out of range')
+        if self.n_starts and self._in_n_run(key):
+            return 'N'
+        return ALPHABET[(self.data[key >> 2] >> (6 - 2 * (key & 3))) & 3]
+
+    def kmer(self, i, k):
+        """ Return the k-mer starting at offset i as an integer (first base
+            in the most significant bits), or None if it overlaps an N. """
+        if i < 0 or i + k > self.length:
+            raise IndexError('k-mer out of range')
+        if self.n_starts:
+            j = bisect.bisect_left(self.n_ends, i + 1)
+            if j < len(self.n_starts) and self.n_starts[j] < i + k:
+                return None
+        lo, hi = i >> 2, ((i + k - 1) >> 2) + 1
+        v = int.from_bytes(self.data[lo:hi], 'big')
+        v >>= 2 * (4 * hi - i - k)
+        return v & ((1 << (2 * k)) - 1)
+
+    def codes(self):
+        """ Return bytes with the 2-bit code of every base (N_CODE for N),
+            unpacked straight from the packed bytes: each of the four bases
+            of a byte is one translate() over the data, interleaved into the
+            result, and the N runs are patched in from the mask.
+        Example:
+        >>> list(PackedSequence("ACGTNNACG").codes())
+        [0, 1, 2, 3, 4, 4, 0, 1, 2]
+        """
+        data = self.data.tobytes()
+        out = bytearray(4 * len(data))
+        for j, table in enumerate(_LANES):
+            out[j::4] = data.translate(table)
+        del out[self.length:]
+        for start, end in zip(self.n_starts, self.n_ends):
+            out[start:end] = bytes([N_CODE]) * (end - start)
+        return bytes(out)
+
+    def reverse_complement(self):
+        """ Return the reverse complement as a new PackedSequence """
+        return PackedSequence(reverse_complement(str(self)))
+
+
+if __name__ == "__main__":
+    import doctest
+    if doctest.testmod().failed == 0:
+        print("Tests passed.")
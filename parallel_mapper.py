@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+"""parallel_mapper.py: Multiprocess driver for read_mapper.ReadMapper."""
+
+import multiprocessing
+import os
+import sys
+
+from fasta import FastaFile, readGenome
+from fastq import iter_fastq_batches
+from kmer_index import FlatIndex, cached_flat_index
+from read_mapper import ReadMapper, StageCounters
+
+# Genomes read by the parent, keyed by file name.  With the fork start
+# method workers inherit this dict, and the string's pages are shared
+# copy-on-write instead of being pickled or re-read per worker.
+_genomes = {}
+_mapper = None
+
+
+def _init_worker(genome_filename, index_filename, max_edits, ref_name):
+    """ Pool initializer: attach to the genome and memory-map the index """
+    global _mapper
+    t = _genomes.get(genome_filename)
+    if t is None:  # spawn / forkserver: nothing inherited
+        t = readGenome(genome_filename)
+    index = FlatIndex.load(index_filename)
+    _mapper = ReadMapper(t, index, max_edits, ref_name)
+
+
+def _map_chunk(records):
+    """ Map one chunk of reads; returns its SAM lines and stage counters """
+    _mapper.counters = StageCounters()
+    return _mapper.map_batch(records), _mapper.counters
+
+
+def reference_name(genome_filename):
+    """ Name of the sole record of a FASTA file, else the file's base name """
+    with FastaFile(genome_filename) as fa:
+        names = fa.names
+    if len(names) == 1:
+        return names[0]
+    return os.path.basename(genome_filename)
+
+
+def parallel_map_fastq(genome_filename, fastq_filename, out, processes=None,
+                       k=10, max_edits=2, chunk_size=2000,
+                       index_filename=None):
+    """ Map the reads of fastq_filename to the genome with a pool of worker
+        processes, writing SAM to out in input order, and return the merged
+        StageCounters of all workers.  The read stream is cut into chunks
+        of chunk_size records handed out with Pool.imap, so only about
+        processes chunks are in flight at a time.  The k-mer index is saved
+        next to the genome (or to index_filename) once by the parent and
+        memory-mapped by every worker, so all processes share one copy in
+        the page cache.
+    Example:
+    >>> import io, tempfile
+    >>> tmp = tempfile.mkdtemp()
+    >>> fq = os.path.join(tmp, 'reads.fq')
+    >>> t = readGenome("lambda_virus.fa")
+    >>> with open(fq, 'w') as fh:
+    ...     for i, o in enumerate([100, 5000, 20000, 7]):
+    ...         _ = fh.write('@r%d\\n%s\\n+\\n%s\\n' % (i, t[o:o+50], 'I' * 50))
+    >>> out = io.StringIO()
+    >>> counters = parallel_map_fastq("lambda_virus.fa", fq, out,
+    ...                               processes=2, chunk_size=1,
+    ...                               index_filename=os.path.join(tmp, 'idx'))
+    >>> [line.split('\\t')[:4] for line in out.getvalue().splitlines()
+    ...  if not line.startswith('@')]  # doctest: +NORMALIZE_WHITESPACE
+    [['r0', '0', 'gi|9626243|ref|NC_001416.1|', '101'],
+     ['r1', '0', 'gi|9626243|ref|NC_001416.1|', '5001'],
+     ['r2', '0', 'gi|9626243|ref|NC_001416.1|', '20001'],
+     ['r3', '0', 'gi|9626243|ref|NC_001416.1|', '8']]
+    >>> counters.items['align']
+    4
+    """
+    if index_filename is None:
+        index_filename = '%s.k%d.idx' % (genome_filename, k)
+    ref_name = reference_name(genome_filename)
+    t = readGenome(genome_filename)
+    _genomes[genome_filename] = t
+    index = cached_flat_index(t, k, index_filename)
+    out.write(ReadMapper(t, index, max_edits, ref_name).sam_header())
+    totals = StageCounters()
+    try:
+        pool = multiprocessing.Pool(processes, _init_worker,
+                                    (genome_filename, index_filename,
+                                     max_edits, ref_name))
+        try:
+            chunks = iter_fastq_batches(fastq_filename, chunk_size)
+            for lines, counters in pool.imap(_map_chunk, chunks):
+                for line in lines:
+                    out.write(line)
+                    out.write('\n')
+                totals.merge(counters)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        del _genomes[genome_filename]
+    return totals
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3:
+        # parallel_mapper.py genome.fasta reads.fastq [processes] > reads.sam
+        nproc = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        stats = parallel_map_fastq(sys.argv[1], sys.argv[2], sys.stdout,
+                                   processes=nproc)
+        sys.stderr.write(stats.report() + '\n')
+    else:
+        import doctest
+        if doctest.testmod().failed == 0:
+            print("Tests passed.")
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+"""read_mapper.py: Seed-and-extend read mapping pipeline with SAM output."""
+
+import sys
+from collections import OrderedDict
+from time import perf_counter
+
+import numpy as np
+
+from alignment import banded_align
+from fastq import iter_fastq_batches
+from kmer_index import FlatIndex, queryIndex
+from packed_seq import reverse_complement
+from vectorized_dp import batch_edit_distance, candidate_windows
+from vectorized_matching import as_uint8
+
+FLAG_UNMAPPED = 4
+FLAG_REVERSE = 16
+
+
+class StageCounters(object):
+    """ Items processed and wall-clock seconds spent per pipeline stage """
+
+    def __init__(self):
+        self.items = OrderedDict()
+        self.seconds = OrderedDict()
+
+    def add(self, stage, items, seconds):
+        self.items[stage] = self.items.get(stage, 0) + items
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def merge(self, other):
+        for stage in other.items:
+            self.add(stage, other.items[stage], other.seconds[stage])
+
+    def throughput(self, stage):
+        """ Items per second for stage """
+        secs = self.seconds.get(stage, 0.0)
+        return self.items.get(stage, 0) / secs if secs > 0 else float('inf')
+
+    def report(self):
+        """ Return one line per stage: name, items, seconds, items/s """
+        return '\n'.join('%-8s %10d items %9.3f s %12.0f /s'
+                         % (stage, self.items[stage], self.seconds[stage],
+                            self.throughput(stage))
+                         for stage in self.items)
+
+
+class ReadMapper(object):
+    """ Maps reads to a reference t allowing up to max_edits edits.
+        Each batch of FASTQ records goes through these stages, each timed
+        into self.counters:
+          seed    split every read (and its reverse complement) into
+                  max_edits + 1 pigeonhole segments
+          lookup  exact index hits of each segment -> candidate loci
+          dedup   collapse candidate loci per read and strand
+          verify  bounded edit distance of all loci of the batch, reads
+                  of the same length in one vectorized call
+          align   CIGAR and position for the best verified loci
+        index may be any object with k and query() (Index, FlatIndex,
+        SuffixArrayIndex, FMIndex); by default a FlatIndex with k=10. """
+
+    def __init__(self, t, index=None, max_edits=2, ref_name='ref',
+                 both_strands=True):
+        self.t = t
+        self.index = index if index is not None else FlatIndex(t, 10)
+        self.max_edits = max_edits
+        self.ref_name = ref_name
+        self.both_strands = both_strands
+        self.counters = StageCounters()
+
+    def seed_batch(self, records):
+        """ Return [(read #, strand, seq, [(segment, offset in read)])] """
+        n = self.max_edits
+        seeds = []
+        for r, (_, seq, _) in enumerate(records):
+            strands = [('+', seq)]
+            if self.both_strands:
+                strands.append(('-', reverse_complement(seq)))
+            for strand, s in strands:
+                seg_len = len(s) // (n + 1)
+                segments = [(s[i * seg_len:(i + 1) * seg_len], i * seg_len)
+                            for i in range(n + 1)]
+                seeds.append((r, strand, s, segments))
+        return seeds
+
+    def lookup_batch(self, seeds):
+        """ Return [(read #, strand, seq, [candidate loci])] """
+        out = []
+        for r, strand, s, segments in seeds:
+            loci = []
+            for segment, offset in segments:
+                if len(segment) < self.index.k:
+                    continue
+                _, occurrences = queryIndex(segment, self.t, self.index)
+                loci.extend(o - offset for o in occurrences)
+            out.append((r, strand, s, loci))
+        return out
+
+    def dedup_batch(self, candidates):
+        """ Drop duplicate loci (several seeds hitting the same place) """
+        return [(r, strand, s, sorted(set(loci)))
+                for r, strand, s, loci in candidates]
+
+    def verify_batch(self, candidates):
+        """ Return [(read #, strand, seq, [(locus, distance)])] keeping only
+            loci within max_edits.  The (read, locus) windows of the whole
+            batch are grouped by read length and each group is one
+            batch_edit_distance call, so the number of NumPy calls does not
+            grow with the number of reads. """
+        k = self.max_edits
+        groups = {}  # read length -> [(candidate #, locus)]
+        for c, (_, _, s, loci) in enumerate(candidates):
+            groups.setdefault(len(s), []).extend((c, locus)
+                                                 for locus in loci)
+        found = [[] for _ in candidates]
+        if groups:
+            tv = as_uint8(self.t)
+        for m, items in groups.items():
+            patterns = np.array([as_uint8(candidates[c][2]) for c, _ in items],
+                                dtype=np.uint8)
+            windows = candidate_windows(m, tv, [locus for _, locus in items],
+                                        k)
+            dist = batch_edit_distance(patterns, windows)
+            for (c, locus), d in zip(items, dist.tolist()):
+                if d <= k:
+                    found[c].append((locus, d))
+        return [(r, strand, s, found[c])
+                for c, (r, strand, s, _) in enumerate(candidates)]
+
+    def align_batch(self, verified, nreads):
+        """ Return, per read, None or (strand, pos, cigar, distance, nbest)
+            for the best-scoring alignment.  Only loci at the read's
+            smallest verified distance are aligned: a plain 'M' run when
+            substitutions alone reach that distance, otherwise a banded
+            alignment around the locus.  Loci within max_edits of one
+            already aligned on the same strand are taken to be the same
+            placement. """
+        k = self.max_edits
+        hits = [[] for _ in range(nreads)]
+        for r, strand, s, verified_loci in verified:
+            hits[r].extend((dist, strand, locus, s)
+                           for locus, dist in verified_loci)
+        best = [None] * nreads
+        for r, read_hits in enumerate(hits):
+            if not read_hits:
+                continue
+            min_dist = min(read_hits)[0]
+            aligned = []
+            for dist, strand, locus, s in sorted(read_hits):
+                if dist > min_dist:
+                    break
+                if any(strand == st and abs(locus - lc) <= k
+                       for st, lc in aligned):
+                    continue
+                aligned.append((strand, locus))
+                window = self.t[locus:locus + len(s)]
+                if len(window) == len(s) and \
+                        sum(a != b for a, b in zip(s, window)) <= dist:
+                    # substitutions alone reach the verified distance
+                    pos, cigar = locus, '%dM' % len(s)
+                else:
+                    # a band of 2k covers every alignment within k edits
+                    # of the window verify_batch scored
+                    lo = max(locus - k, 0)
+                    aln = banded_align(s, self.t[lo:locus + len(s) + k],
+                                       locus - lo, 2 * k)
+                    pos, cigar = lo + aln.start, aln.cigar
+                if best[r] is None:
+                    best[r] = [strand, pos, cigar, dist, 1]
+                else:
+                    best[r][4] += 1
+        return best
+
+    def sam_header(self):
+        return ('@HD\tVN:1.6\tSO:unsorted\n@SQ\tSN:%s\tLN:%d\n'
+                '@PG\tID:read_mapper\tPN:read_mapper\n'
+                % (self.ref_name, len(self.t)))
+
+    def sam_records(self, records, best):
+        """ Return SAM lines for records given their best placements """
+        lines = []
+        for (name, seq, qual), hit in zip(records, best):
+            qname = name.split()[0] if name else '*'
+            if hit is None:
+                lines.append('%s\t%d\t*\t0\t0\t*\t*\t0\t0\t%s\t%s'
+                             % (qname, FLAG_UNMAPPED, seq, qual or '*'))
+                continue
+            strand, pos, cigar, dist, nbest = hit
+            flag = 0
+            if strand == '-':
+                flag |= FLAG_REVERSE
+                seq, qual = reverse_complement(seq), qual[::-1]
+            mapq = 60 if nbest == 1 else 0
+            lines.append('%s\t%d\t%s\t%d\t%d\t%s\t*\t0\t0\t%s\t%s\tNM:i:%d'
+                         % (qname, flag, self.ref_name, pos + 1, mapq, cigar,
+                            seq, qual or '*', dist))
+        return lines
+
+    def map_batch(self, records):
+        """ Run one batch of (name, seq, qual) records through every stage
+            and return its SAM lines
+        Example:
+        >>> t = "GATTACAGGCATTAGCCATTAGGACCATGACATGGTTACCAGGATTTAACCCGAGTAAGC"
+        >>> mapper = ReadMapper(t, FlatIndex(t, 4), max_edits=1)
+        >>> reads = [("r1", "CATTAGGACCTTGACATG", "I" * 18),
+        ...          ("r2", "CTGGTAACCATGTCATGG", "I" * 18),
+        ...          ("r3", "AAAAAAAAAAAAAAAAAA", "I" * 18)]
+        >>> for line in mapper.map_batch(reads):
+        ...     print(line.split('\\t')[:6])
+        ['r1', '0', 'ref', '17', '60', '18M']
+        ['r2', '16', 'ref', '25', '60', '18M']
+        ['r3', '4', '*', '0', '0', '*']
+        >>> list(mapper.counters.items.items())[:2]
+        [('seed', 3), ('lookup', 6)]
+        """
+        stages = [('seed', self.seed_batch), ('lookup', self.lookup_batch),
+                  ('dedup', self.dedup_batch), ('verify', self.verify_batch)]
+        data = records
+        for stage, fn in stages:
+            start = perf_counter()
+            nitems = len(data)
+            data = fn(data)
+            self.counters.add(stage, nitems, perf_counter() - start)
+        start = perf_counter()
+        best = self.align_batch(data, len(records))
+        lines = self.sam_records(records, best)
+        self.counters.add('align', len(records), perf_counter() - start)
+        return lines
+
+    def map_fastq(self, filename, out, batch_size=10000):
+        """ Map every read in a FASTQ file, writing SAM to out """
+        out.write(self.sam_header())
+        for batch in iter_fastq_batches(filename, batch_size):
+            for line in self.map_batch(batch):
+                out.write(line)
+                out.write('\n')
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        # read_mapper.py genome.fasta reads.fastq > reads.sam
+        from fasta import readGenome
+        mapper = ReadMapper(readGenome(sys.argv[1]))
+        mapper.map_fastq(sys.argv[2], sys.stdout)
+        sys.stderr.write(mapper.counters.report() + '\n')
+    else:
+        import doctest
+        if doctest.testmod().failed == 0:
+            print("Tests passed.")
@@ -1,4 +1,13 @@
 import itertools
+from heapq import heappop, heappush
+
+import numpy as np
+
+from fastq import iter_sequences
+
+
+# g[mask, i] when string i is not in mask
+NO_PATH = -(1 << 30)
 
 
 def overlap(a, b, min_length=3):
@@ -17,10 +26,47 @@ def overlap(a, b, min_length=3):
         start += 1  # move just past previous match
 
 
+def overlap_matrix(ss):
+    """ Returns the n x n array of overlap(ss[i], ss[j], min_length=1)
+    (the diagonal is left 0) """
+    n = len(ss)
+    ov = np.zeros((n, n), dtype=np.int32)
+    for i, j in itertools.permutations(range(n), 2):
+        ov[i, j] = overlap(ss[i], ss[j], min_length=1)
+    return ov
+
+
+def best_orderings(ov):
+    """ Held-Karp over subsets: returns g with g[mask, i] the largest total
+    overlap of an ordering of the strings in mask that starts with string
+    i (a large negative value when i is not in mask).  Subsets of the same
+    size are filled in together, one NumPy gather per starting string, so
+    the whole table costs O(2^n * n^2) array operations and 4 * n * 2^n
+    bytes; about 20 strings is practical.
+    """
+    n = len(ov)
+    masks = np.arange(1 << n)
+    size = np.zeros(1 << n, dtype=np.int8)
+    for i in range(n):
+        size += (masks >> i) & 1
+    g = np.full((1 << n, n), NO_PATH, dtype=np.int32)
+    for i in range(n):
+        g[1 << i, i] = 0
+    for k in range(2, n + 1):
+        layer = masks[size == k]
+        for i in range(n):
+            with_i = layer[(layer >> i) & 1 == 1]
+            # i followed by the best ordering of the rest starting at j
+            g[with_i, i] = (g[with_i ^ (1 << i)] + ov[i]).max(axis=1)
+    return g
+
+
 def scs(ss):
     """ 
     Returns shortest common superstring of given
-    strings, which must be the same length 
+    strings, which must be the same length.  Among the orderings of ss
+    giving the shortest superstring, the one listed first by
+    itertools.permutations is used.
 
     Example 1:
     >>> scs(["ABC", "BCA", "CAB"])
@@ -29,26 +75,34 @@ def scs(ss):
     Example 2:
     >>> len(scs(["CCT", "CTT", "TGC", "TGG", "GAT", "ATT"]))
     11
-    """
-    shortest_sup = None
-    all_substrings = set()
-    for ssperm in itertools.permutations(ss):
-        sup = ssperm[0]  # superstring starts as first string
-        for i in range(len(ss) - 1):
-            # overlap adjacent strings A and B in the permutation
-            olen = overlap(ssperm[i], ssperm[i + 1], min_length=1)
-            # add non-overlapping portion of B to superstring
-            sup += ssperm[i + 1][olen:]
-        if shortest_sup is None or len(sup) < len(shortest_sup):
-            shortest_sup = sup  # found shorter superstring
 
-    return shortest_sup  # return shortest
+    Example 3 (20 strings):
+    >>> t = "GATTACAGGCATTAGCCATTAGGACCATGACATGGTTACCAGGATTTAACCCGAGTAAGC"
+    >>> scs([t[i:i + 8] for i in range(0, 60, 3)][::-1]) == t[:65]
+    True
+    """
+    n = len(ss)
+    full = (1 << n) - 1
+    ov = overlap_matrix(ss)
+    g = best_orderings(ov)
+    i = int(np.argmax(g[full]))  # argmax picks the first best start
+    sup = ss[i]
+    mask = full
+    while mask != 1 << i:
+        rest = mask ^ (1 << i)
+        # smallest next string that keeps the ordering optimal
+        j = int(np.argmax(ov[i] + g[rest] == g[mask, i]))
+        sup += ss[j][ov[i, j]:]
+        mask, i = rest, j
+    return sup  # return shortest
 
 
 def scs_list(ss):
     """ 
-    Returns shortest common superstring of given
-    strings, which must be the same length 
+    Returns the number of distinct shortest common superstrings of given
+    strings, which must be the same length.  Only orderings that stay
+    optimal (per best_orderings) are followed, and the superstrings
+    reachable from each (subset, first string) state are computed once.
 
     Example 1:
     >>> scs_list(['ABC', 'BCA', 'CAB'])
@@ -58,39 +112,36 @@ def scs_list(ss):
     >>> scs_list(["CCT", "CTT", "TGC", "TGG", "GAT", "ATT"])
     4
     """
-    shortest_sup_1 = scs(ss)
-    all_substrings = {shortest_sup_1}
-    for ssperm in itertools.permutations(ss):
-        sup = ssperm[0]  # superstring starts as first string
-        for i in range(len(ss) - 1):
-            # overlap adjacent strings A and B in the permutation
-            olen = overlap(ssperm[i], ssperm[i + 1], min_length=1)
-            # add non-overlapping portion of B to superstring
-            sup += ssperm[i + 1][olen:]
-
-        if len(sup) == len(shortest_sup_1):
-            shortest_sup = sup  # found shorter superstring
-            all_substrings.add(shortest_sup)
-
-    return len(all_substrings)
+    n = len(ss)
+    full = (1 << n) - 1
+    ov = overlap_matrix(ss)
+    g = best_orderings(ov)
+    memo = {}
 
+    def superstrings(mask, i):
+        """ Distinct optimal superstrings of mask's strings starting at i """
+        key = (mask, i)
+        if key not in memo:
+            rest = mask ^ (1 << i)
+            if not rest:
+                memo[key] = {ss[i]}
+            else:
+                found = set()
+                for j in np.flatnonzero(ov[i] + g[rest] == g[mask, i]):
+                    olen = ov[i, j]
+                    found.update(ss[i] + s[olen:]
+                                 for s in superstrings(rest, int(j)))
+                memo[key] = found
+        return memo[key]
 
-def readFastq(filename):
-    sequences = []
+    best = g[full].max()
+    all_superstrings = set()
+    for i in np.flatnonzero(g[full] == best):
+        all_superstrings |= superstrings(full, int(i))
+    return len(all_superstrings)
 
-    with open(filename) as fh:
-        while True:
-            fh.readline()  # skip name line
-            seq = fh.readline().rstrip()  # read base sequence
-            fh.readline()  # skip placeholder line
-            qual = fh.readline().rstrip()  # base quality line
-            if len(seq) == 0:
-                break
-            sequences.append(seq)
-    return sequences
 
-
-reads = readFastq("ads1_week4_reads.fq")
+reads = list(iter_sequences("ads1_week4_reads.fq"))
 
 
 def pick_max_overlap(reads, k):
@@ -105,20 +156,133 @@ def pick_max_overlap(reads, k):
     return reada, readb, best_olen
 
 
+def _overlap(a, b, k):
+    """ overlap(a, b, k), looking only at the parts of a long a (or b) that
+        an overlap with the other string can reach """
+    return overlap(a[-len(b):], b[:len(a)], k)
+
+
 def greedy_scs(reads, k):
     """
+    Returns the superstring built by repeatedly merging the two reads with
+    the longest overlap (at least k), ties going to the pair that comes
+    first in the read list, exactly like the pick_max_overlap loop.
+    Candidate pairs come from an index of the reads' k-length prefixes and
+    are kept in a heap keyed (-overlap, rank of a, rank of b); pairs with a
+    merged-away read are dropped when they reach the top.  A merged read
+    c = a + b[olen:] starts like a and ends like b, so only reads that
+    overlapped into a or out of b, or that contain a or b whole, are
+    rechecked against it.  As in overlap(), a read b shorter than k
+    overlaps a read a (by len(b)) only when it is a suffix of a; such
+    pairs are found through an index of the short reads' texts.
     Example 1:
     >>> greedy_scs(["ABC", "BCA", "CAB"], 2)
     'CABCA'
+    >>> greedy_scs(["ABCD", "CDBC", "BCDA"], 1)
+    'CDBCABCDA'
+    >>> greedy_scs(["CD", "TTGA", "GACD"], 3)  # CD is a suffix of GACD
+    'TTGAGACD'
     """
+    texts = list(reads)
+    n = len(texts)
+    alive = [True] * n
+    parent = list(range(n))  # read -> read it was merged into
+    # Reads in list order are the alive ones sorted by id; identical reads
+    # are kept per text so a merge removes the first copy, as list.remove
+    copies = {}
+    for i, r in enumerate(texts):
+        copies.setdefault(r, []).append(i)
+    # k-mer -> original reads starting with / containing it
+    prefix = {}
+    for i, r in enumerate(texts):
+        if len(r) >= k:
+            prefix.setdefault(r[:k], []).append(i)
+    contains = {}
+    for i, r in enumerate(texts):
+        for km in set(r[j:j + k] for j in range(len(r) - k + 1)):
+            if km in prefix:
+                contains.setdefault(km, []).append(i)
+    # text -> reads shorter than k spelling it
+    short = {}
+    for i, r in enumerate(texts):
+        if 0 < len(r) < k:
+            short.setdefault(r, []).append(i)
+
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    heap = []
+    # read -> reads it overlaps / reads overlapping it, as pushed on heap
+    out = [[] for _ in range(n)]
+    inn = [[] for _ in range(n)]
+
+    def push(a, b):
+        olen = _overlap(texts[a], texts[b], k)
+        if olen > 0:
+            heappush(heap, (-olen, a, b))
+            out[a].append(b)
+            inn[b].append(a)
+
+    def push_short_suffixes(a):
+        r = texts[a]
+        for length in range(1, min(k, len(r) + 1)):
+            for b in short.get(r[-length:], ()):
+                if b != a and alive[b]:
+                    push(a, b)
 
-    reada, readb, olen = pick_max_overlap(reads, k)
-    while olen > 0:
-        reads.remove(reada)
-        reads.remove(readb)
-        reads.append(reada + readb[olen:])
-        reada, readb, olen = pick_max_overlap(reads, k)
-    return "".join(reads)
+    for km, sources in contains.items():
+        for a in sources:
+            for b in prefix[km]:
+                if a != b:
+                    push(a, b)
+    if short:
+        for a in range(n):
+            push_short_suffixes(a)
+    while heap:
+        neg_olen, a, b = heappop(heap)
+        if not (alive[a] and alive[b]):
+            continue
+        ta, tb = texts[a], texts[b]
+        olen = -neg_olen
+        a = heappop(copies[ta])
+        if not copies[ta]:
+            del copies[ta]
+        b = heappop(copies[tb])
+        if not copies[tb]:
+            del copies[tb]
+        alive[a] = alive[b] = False
+        c = len(texts)
+        texts.append(ta + tb[olen:])
+        alive.append(True)
+        parent.append(c)
+        out.append([])
+        inn.append([])
+        parent[a] = parent[b] = c
+        heappush(copies.setdefault(texts[c], []), c)
+        # An overlap with c longer than b (a) needs b (a) inside the read
+        succ = set(x for x in out[b] if alive[x])
+        succ.update(x for x in set(find(x) for x in contains.get(tb[:k], ()))
+                    if tb in texts[x])
+        pred = set(x for x in inn[a] if alive[x])
+        pred.update(x for x in set(find(x) for x in contains.get(ta[:k], ()))
+                    if ta in texts[x])
+        out[a] = out[b] = inn[a] = inn[b] = None
+        for x in sorted(succ):
+            if x != c:
+                push(c, x)
+        for x in sorted(pred):
+            if x != c:
+                push(x, c)
+        if short:
+            if len(texts[c]) < k:
+                short.setdefault(texts[c], []).append(c)
+            push_short_suffixes(c)
+    return "".join(texts[i] for i in range(len(texts)) if alive[i])
 
 
 print(greedy_scs(reads, 30))
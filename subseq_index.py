@@ -1,5 +1,7 @@
 import bisect
 
+from fasta import readGenome
+
 
 class SubseqIndex(object):
     """ Holds a subsequence index for a text T """
@@ -44,16 +46,6 @@ def query_subseq(p, t, subseq_ind):
     return occurrences, num_index_hits
 
 
-def readGenome(filename):
-    genome = ''
-    with open(filename, 'r') as f:
-        for line in f:
-            # ignore header line with genome information
-            if not line[0] == '>':
-                genome += line.rstrip()
-    return genome
-
-
 # p = "GGCGCGGTGGCTCACGCCTGTAAT"
 # t = readGenome("chr1.GRCh38.excerpt.fasta")
 # sub_index = SubseqIndex(t, k=8, ival=3)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+"""suffix_array.py: Suffix array + LCP index for exact matching."""
+
+from array import array
+
+from packed_seq import PackedSequence
+
+
+def suffix_array(t):
+    """ Return the suffix array of t, built by prefix doubling on integer
+        rank arrays: each round sorts suffixes by (rank of first h chars,
+        rank of next h chars) until every rank is distinct.
+    Example:
+    >>> list(suffix_array("banana"))
+    [5, 3, 1, 0, 4, 2]
+    """
+    n = len(t)
+    if n == 0:
+        return array('l')
+    rank = [ord(c) for c in t]
+    sa = sorted(range(n), key=rank.__getitem__)
+    h = 1
+    while True:
+        # Rank pair packed into one int: (rank[i], rank[i+h] or -1 past end)
+        second = rank[h:] + [-1] * min(h, n)
+        base = max(rank) + 2
+        keys = [a * base + b + 1 for a, b in zip(rank, second)]
+        sa.sort(key=keys.__getitem__)
+        new_rank = [0] * n
+        r = 0
+        prev = keys[sa[0]]
+        for i in sa:
+            if keys[i] != prev:
+                r += 1
+                prev = keys[i]
+            new_rank[i] = r
+        rank = new_rank
+        if r == n - 1 or h >= n:
+            break
+        h *= 2
+    return array('l', sa)
+
+
+def lcp_array(t, sa):
+    """ Return the LCP array (Kasai et al.): lcp[i] is the length of the
+        longest common prefix of suffixes sa[i-1] and sa[i]; lcp[0] = 0.
+    Example:
+    >>> t = "banana"
+    >>> list(lcp_array(t, suffix_array(t)))
+    [0, 1, 3, 0, 0, 2]
+    """
+    n = len(t)
+    rank = [0] * n
+    for i, s in enumerate(sa):
+        rank[s] = i
+    lcp = array('l', [0]) * n
+    h = 0
+    for i in range(n):
+        r = rank[i]
+        if r > 0:
+            j = sa[r - 1]
+            while i + h < n and j + h < n and t[i + h] == t[j + h]:
+                h += 1
+            lcp[r] = h
+            if h > 0:
+                h -= 1
+        else:
+            h = 0
+    return lcp
+
+
+class SuffixArrayIndex(object):
+    """ Holds a suffix array and LCP array for a text T.  Exact matches of
+        a pattern of any length are found by binary search in O(m log n).
+        With the default k=0 query() returns offsets of the whole pattern;
+        with k > 0 it returns hits for the first k characters, like Index.
+        Either way queryIndex and pigeon_hole_index_matching accept it,
+        since they verify p[k:] themselves. """
+
+    def __init__(self, t, k=0):
+        if isinstance(t, PackedSequence):
+            t = str(t)
+        self.t = t
+        self.k = k
+        self.sa = suffix_array(t)
+        self.lcp = lcp_array(t, self.sa)
+
+    def _range(self, p):
+        """ Return [lo, hi) such that sa[lo:hi] are the suffixes starting
+            with p """
+        t, sa, m = self.t, self.sa, len(p)
+        lo, hi = 0, len(sa)
+        while lo < hi:  # leftmost suffix >= p
+            mid = (lo + hi) // 2
+            if t[sa[mid]:sa[mid] + m] < p:
+                lo = mid + 1
+            else:
+                hi = mid
+        start = lo
+        hi = len(sa)
+        while lo < hi:  # leftmost suffix whose first m chars are > p
+            mid = (lo + hi) // 2
+            if t[sa[mid]:sa[mid] + m] <= p:
+                lo = mid + 1
+            else:
+                hi = mid
+        return start, lo
+
+    def count(self, p):
+        """ Return the number of occurrences of p without listing them
+        Example:
+        >>> SuffixArrayIndex("ACGTACGTTACG").count("ACG")
+        3
+        """
+        if self.k:
+            p = p[:self.k]
+        lo, hi = self._range(p)
+        return hi - lo
+
+    def query(self, p):
+        """ Return sorted offsets where p (or its first k chars) occurs
+        Example:
+        >>> SuffixArrayIndex("ACGTACGTTACG").query("ACGTT")
+        [4]
+        >>> SuffixArrayIndex("ACGTACGTTACG", k=3).query("ACGTT")
+        [0, 4, 9]
+        """
+        if self.k:
+            p = p[:self.k]
+        lo, hi = self._range(p)
+        return sorted(self.sa[lo:hi])
+
+    def longest_repeat(self):
+        """ Return (length, offset) of the longest substring occurring at
+            least twice, read off the LCP array
+        Example:
+        >>> SuffixArrayIndex("banana").longest_repeat()
+        (3, 1)
+        """
+        if len(self.lcp) == 0:
+            return 0, 0
+        best = max(range(len(self.lcp)), key=self.lcp.__getitem__)
+        return self.lcp[best], self.sa[best]
+
+
+if __name__ == "__main__":
+    import doctest
+    if doctest.testmod().failed == 0:
+        print("Tests passed.")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+"""vectorized_dp.py: Anti-diagonal NumPy edit-distance DP over many windows."""
+
+import numpy as np
+
+from vectorized_matching import as_uint8
+
+
+def batch_edit_distance(p, windows, semiglobal=True):
+    """ Return an array with the edit distance of p against every row of
+        windows (a 2-D uint8 array, or a list of equal-length strings).
+        p may also hold one pattern per window (a 2-D uint8 array or a
+        list of equal-length strings), so candidates of many reads of the
+        same length are aligned in one call.
+        Cells on one anti-diagonal of the DP matrix do not depend on each
+        other, so each diagonal is computed for all windows at once: the
+        whole batch costs O(len(p) + window length) NumPy calls.  With
+        semiglobal=True (like edit_distance_approx) p may match anywhere
+        inside a window; otherwise p is aligned to the whole window (like
+        edit_distance).
+    Example:
+    >>> batch_edit_distance("GCGTATGC", ["TATTGGCTATACGGTT",
+    ...                                  "GCGTATGCAAAAAAAA"]).tolist()
+    [2, 0]
+    >>> batch_edit_distance("shake spea", ["Shakespear"],
+    ...                     semiglobal=False).tolist()
+    [3]
+    >>> batch_edit_distance(["GCGTATGC", "TTTTTTTT"],
+    ...                     ["TATTGGCTATACGGTT", "GCGTATGCAAAAAAAA"]).tolist()
+    [2, 6]
+    """
+    if not isinstance(windows, np.ndarray):
+        if len(windows) == 0:
+            return np.zeros(0, dtype=np.int32)
+        windows = np.array([as_uint8(w) for w in windows], dtype=np.uint8)
+    if isinstance(p, np.ndarray) and p.ndim == 2:
+        pv = p
+    elif isinstance(p, (list, tuple)):
+        pv = np.array([as_uint8(q) for q in p], dtype=np.uint8)
+    else:
+        pv = as_uint8(p)
+    m = pv.shape[-1]
+    nwin, n = windows.shape
+    big = np.iinfo(np.int32).max // 2
+    # Three rolling anti-diagonals, each indexed by row i of the DP matrix
+    prev2 = np.full((nwin, m + 1), big, dtype=np.int32)
+    prev1 = np.full((nwin, m + 1), big, dtype=np.int32)
+    cur = np.full((nwin, m + 1), big, dtype=np.int32)
+    best = np.full(nwin, big, dtype=np.int32)
+    for d in range(m + n + 1):
+        lo, hi = max(0, d - n), min(m, d)  # rows on this diagonal
+        cur.fill(big)
+        if lo == 0:
+            cur[:, 0] = 0 if semiglobal else d  # first row
+        if hi == d:
+            cur[:, d] = d  # first column
+        ilo, ihi = max(lo, 1), min(hi, d - 1)  # interior cells
+        if ilo <= ihi:
+            rows = np.arange(ilo, ihi + 1)
+            # cell (i, j=d-i) compares p[i-1] with window[j-1]
+            mismatch = windows[:, d - rows - 1] != pv[..., rows - 1]
+            diag = prev2[:, ilo - 1:ihi] + mismatch
+            vert = prev1[:, ilo - 1:ihi] + 1
+            horz = prev1[:, ilo:ihi + 1] + 1
+            cur[:, ilo:ihi + 1] = np.minimum(np.minimum(diag, vert), horz)
+        if hi == m and semiglobal:
+            np.minimum(best, cur[:, m], out=best)
+        prev2, prev1, cur = prev1, cur, prev2
+    if semiglobal:
+        return best
+    return prev1[:, m]
+
+
+def candidate_windows(p, t, offsets, k):
+    """ Return a (len(offsets), len(p) + 2k) uint8 array of the text around
+        each candidate offset, padded with zero bytes (which never match)
+        past either end of t.  Only len(p) is used, so p may be a length;
+        t may be a uint8 array from as_uint8, to convert it only once. """
+    tv = as_uint8(t)
+    span = (p if isinstance(p, int) else len(p)) + 2 * k
+    idx = np.asarray(offsets, dtype=np.int64)[:, None] - k + np.arange(span)
+    inside = (idx >= 0) & (idx < len(tv))
+    return np.where(inside, tv[np.clip(idx, 0, len(tv) - 1)], 0).astype(np.uint8)
+
+
+def verify_candidates(p, t, offsets, k):
+    """ Return (offset, distance) for each candidate offset of p in t whose
+        window t[offset-k : offset+len(p)+k] holds a match within edit
+        distance k, all candidates being aligned in one batch
+    Example:
+    >>> verify_candidates("ACGTTGCA", "TTACGTAGCATTTACGTTGCAT", [2, 13, 5], 1)
+    [(2, 1), (13, 0)]
+    """
+    offsets = sorted(set(offsets))
+    if not offsets:
+        return []
+    dist = batch_edit_distance(p, candidate_windows(p, t, offsets, k))
+    return [(o, int(d)) for o, d in zip(offsets, dist) if d <= k]
+
+
+if __name__ == "__main__":
+    import doctest
+    if doctest.testmod().failed == 0:
+        print("Tests passed.")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+"""vectorized_matching.py: NumPy backend for naive mismatch scanning."""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from packed_seq import PackedSequence
+
+# Above this many window cells, accumulate one pattern column at a time
+# instead of materialising the whole (alignments x m) comparison matrix
+BROADCAST_LIMIT = 1 << 24
+
+
+def as_uint8(s):
+    """ Return a uint8 array over the characters of s, a str, bytes-like
+        object (e.g. a FastaFile.sequence view; no copy) or PackedSequence """
+    if isinstance(s, PackedSequence):
+        s = str(s)
+    if isinstance(s, str):
+        s = s.encode('ascii')
+    return np.frombuffer(s, dtype=np.uint8)
+
+
+def mismatch_counts(p, t):
+    """ Return an array holding, for every offset i of t, the number of
+        mismatches between p and t[i:i+len(p)].  Short texts compare all
+        windows against p in one broadcast; long texts add up one boolean
+        comparison per pattern position over a sliding slice of t.
+    Example:
+    >>> mismatch_counts("ACG", "ACGTACTT").tolist()
+    [0, 3, 3, 3, 1, 3]
+    """
+    pv, tv = as_uint8(p), as_uint8(t)
+    m = len(pv)
+    nalign = len(tv) - m + 1
+    if nalign <= 0:
+        return np.zeros(0, dtype=np.int32)
+    if nalign * m <= BROADCAST_LIMIT:
+        windows = sliding_window_view(tv, m)
+        return np.count_nonzero(windows != pv, axis=1).astype(np.int32)
+    counts = np.zeros(nalign, dtype=np.int32)
+    for j in range(m):
+        counts += tv[j:j + nalign] != pv[j]
+    return counts
+
+
+def naive_numpy(p, t, n=0):
+    """ Return offsets where p occurs in t with at most n mismatches, the
+        same list the pure-Python naive / naive_2mm loops produce
+    Example:
+    >>> naive_numpy("ATGC", "AATGCTTTATGC")
+    [1, 8]
+    >>> naive_numpy("ATGC", "AATGCTTTATGC", n=1)
+    [1, 8]
+    >>> naive_numpy("ATGC", "AATGCTTTATGC", n=3)
+    [0, 1, 4, 5, 6, 8]
+    """
+    return np.flatnonzero(mismatch_counts(p, t) <= n).tolist()
+
+
+if __name__ == "__main__":
+    import doctest
+    if doctest.testmod().failed == 0:
+        print("Tests passed.")